@@ -7,12 +7,18 @@ from sqlalchemy import (
     DateTime,
     Enum,
     Numeric,
+    Double,
+    Computed,
     Text,
     ForeignKey,
     UniqueConstraint,
     Index,
     JSON,
+    LargeBinary,
+    DDL,
+    event,
 )
+from sqlalchemy.dialects.mysql import LONGBLOB
 from sqlalchemy.orm import relationship
 from .session import Base
 import datetime
@@ -21,12 +27,18 @@ import datetime
 N_PRICE = Numeric(24, 6)
 N_BIG = Numeric(30, 2)
 N_RATIO = Numeric(24, 8)
+# Statistical features/metrics: plain DOUBLE read back as float, no Decimal parsing
+N_STAT = Double(asdecimal=False)
+# Binary payloads (zstd-compressed arrays) can be megabytes: LONGBLOB on MySQL
+B_LARGE = LargeBinary().with_variant(LONGBLOB(), "mysql")
 
 
 class Company(Base):
     __tablename__ = "companies"
     id = Column(Integer, primary_key=True, autoincrement=True)
     symbol = Column(String(32), nullable=False)
+    # NSE symbol without the exchange suffix (RELIANCE.NS -> RELIANCE), maintained by MySQL for bhavcopy joins
+    base_symbol = Column(String(32), Computed("UPPER(SUBSTRING_INDEX(TRIM(symbol), '.', 1))", persisted=True))
     name = Column(String(128))
     exchange = Column(String(32), nullable=False)
     sector = Column(String(64))
@@ -36,12 +48,18 @@ class Company(Base):
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 
-    __table_args__ = (UniqueConstraint("symbol", "exchange", name="uq_symbol_exchange"),)
+    __table_args__ = (
+        UniqueConstraint("symbol", "exchange", name="uq_symbol_exchange"),
+        Index("idx_companies_base_symbol", "base_symbol"),
+    )
 
-    price_history = relationship("PriceHistory", back_populates="company", cascade="all, delete-orphan")
-    corporate_actions = relationship("CorporateAction", back_populates="company", cascade="all, delete-orphan")
-    features = relationship("FeatureDaily", back_populates="company", cascade="all, delete-orphan")
-    predictions = relationship("ModelPrediction", back_populates="company", cascade="all, delete-orphan")
+    # No implicit loads: ETL code must opt in (e.g. selectinload) and deletes rely on ON DELETE CASCADE
+    # price_history has no DB-level FK (partitioned table): the trg_companies_delete_prices trigger
+    # (see PriceHistory) deletes its rows instead, so passive_deletes holds for it too
+    price_history = relationship("PriceHistory", primaryjoin="Company.id == foreign(PriceHistory.company_id)", back_populates="company", cascade="all, delete-orphan", lazy="raise_on_sql", passive_deletes=True)
+    corporate_actions = relationship("CorporateAction", back_populates="company", cascade="all, delete-orphan", lazy="raise_on_sql", passive_deletes=True)
+    features = relationship("FeatureDaily", back_populates="company", cascade="all, delete-orphan", lazy="raise_on_sql", passive_deletes=True)
+    predictions = relationship("ModelPrediction", back_populates="company", cascade="all, delete-orphan", lazy="raise_on_sql", passive_deletes=True)
 
 
 class CorporateAction(Base):
@@ -55,14 +73,25 @@ class CorporateAction(Base):
     ratio_to = Column(Integer)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
-    company = relationship("Company", back_populates="corporate_actions")
+    company = relationship("Company", back_populates="corporate_actions", lazy="raise_on_sql")
+
+
+# price_history is RANGE-partitioned by year on trade_date so date-range scans prune partitions.
+# Add next year's partition before it starts (see schema.sql: ALTER TABLE ... REORGANIZE PARTITION pmax).
+PRICE_PARTITION_YEARS = range(2000, 2028)
+PRICE_PARTITIONS = ", ".join(
+    [f"PARTITION p{y} VALUES LESS THAN (TO_DAYS('{y + 1}-01-01'))" for y in PRICE_PARTITION_YEARS]
+    + ["PARTITION pmax VALUES LESS THAN MAXVALUE"]
+)
 
 
 class PriceHistory(Base):
     __tablename__ = "price_history"
+    # MySQL requires the partitioning column in every unique key (incl. the PK) and does not allow
+    # foreign keys on partitioned tables: company_id is not a DB-level FK, deletes must clear rows explicitly
     id = Column(BigInteger, primary_key=True, autoincrement=True)
-    company_id = Column(Integer, ForeignKey("companies.id", ondelete="CASCADE"), nullable=False)
-    trade_date = Column(Date, nullable=False)
+    company_id = Column(Integer, nullable=False)
+    trade_date = Column(Date, primary_key=True, nullable=False)
     open = Column(N_PRICE)
     high = Column(N_PRICE)
     low = Column(N_PRICE)
@@ -71,35 +100,57 @@ class PriceHistory(Base):
     volume = Column(BigInteger)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
-    company = relationship("Company", back_populates="price_history")
+    company = relationship(
+        "Company",
+        primaryjoin="foreign(PriceHistory.company_id) == Company.id",
+        back_populates="price_history",
+        lazy="raise_on_sql",
+    )
 
     __table_args__ = (
         UniqueConstraint("company_id", "trade_date", name="uq_price_company_date"),
-        Index("idx_price_company_date", "company_id", "trade_date"),
+        Index("idx_price_company_date", "company_id", "trade_date", mysql_using="BTREE"),
+        Index("idx_price_trade_date", "trade_date"),
+        Index("idx_price_volume_date", "volume", "trade_date"),
+        {
+            "mysql_partition_by": f"RANGE (TO_DAYS(trade_date)) ({PRICE_PARTITIONS})",
+        },
     )
 
 
+# Stands in for ON DELETE CASCADE on price_history.company_id (partitioned tables cannot have FKs);
+# created with the table by metadata.create_all, mirrored in schema.sql
+event.listen(
+    PriceHistory.__table__,
+    "after_create",
+    DDL(
+        "CREATE TRIGGER trg_companies_delete_prices BEFORE DELETE ON companies "
+        "FOR EACH ROW DELETE FROM price_history WHERE company_id = OLD.id"
+    ).execute_if(dialect="mysql"),
+)
+
+
 class FeatureDaily(Base):
     __tablename__ = "features_daily"
     id = Column(BigInteger, primary_key=True, autoincrement=True)
     company_id = Column(Integer, ForeignKey("companies.id", ondelete="CASCADE"), nullable=False)
     feature_date = Column(Date, nullable=False)
 
-    return_1d = Column(N_PRICE)
-    return_5d = Column(N_PRICE)
-    return_10d = Column(N_PRICE)
-    return_21d = Column(N_PRICE)
+    return_1d = Column(N_STAT)
+    return_5d = Column(N_STAT)
+    return_10d = Column(N_STAT)
+    return_21d = Column(N_STAT)
 
-    volatility_10d = Column(N_PRICE)
-    volatility_20d = Column(N_PRICE)
-    volatility_60d = Column(N_PRICE)
+    volatility_10d = Column(N_STAT)
+    volatility_20d = Column(N_STAT)
+    volatility_60d = Column(N_STAT)
 
-    momentum_14d = Column(N_PRICE)
-    volume_change_5d = Column(N_PRICE)
+    momentum_14d = Column(N_STAT)
+    volume_change_5d = Column(N_STAT)
 
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
-    company = relationship("Company", back_populates="features")
+    company = relationship("Company", back_populates="features", lazy="raise_on_sql")
 
     __table_args__ = (UniqueConstraint("company_id", "feature_date", name="uq_features_company_date"),)
 
@@ -109,11 +160,11 @@ class ModelPrediction(Base):
     id = Column(BigInteger, primary_key=True, autoincrement=True)
     company_id = Column(Integer, ForeignKey("companies.id", ondelete="CASCADE"), nullable=False)
     prediction_date = Column(Date, nullable=False)
-    predicted_return = Column(N_PRICE)
+    predicted_return = Column(N_STAT)
     model_version = Column(String(128), nullable=False)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
-    company = relationship("Company", back_populates="predictions")
+    company = relationship("Company", back_populates="predictions", lazy="raise_on_sql")
 
     __table_args__ = (
         UniqueConstraint("company_id", "prediction_date", "model_version", name="uq_pred_company_date_version"),
@@ -125,7 +176,9 @@ class CovarianceMatrix(Base):
     id = Column(BigInteger, primary_key=True, autoincrement=True)
     calc_date = Column(Date, nullable=False)
     num_assets = Column(Integer, nullable=False)
-    matrix_json = Column(Text, nullable=False)  # JSON string, optionally compressed
+    # zstd-compressed raw array bytes (num_assets x num_assets of dtype); see database.serialization
+    matrix_blob = Column(B_LARGE, nullable=False)
+    dtype = Column(String(16), nullable=False, default="float64")
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
     __table_args__ = (UniqueConstraint("calc_date", name="uq_cov_calc_date"),)
@@ -135,7 +188,7 @@ class OptimizedPortfolio(Base):
     __tablename__ = "optimized_portfolios"
     id = Column(BigInteger, primary_key=True, autoincrement=True)
     portfolio_date = Column(Date, nullable=False)
-    weights_json = Column(Text, nullable=False)
+    weights_json = Column(JSON, nullable=False)
     objective_value = Column(N_PRICE)
     model_version = Column(String(128), nullable=False)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
@@ -149,10 +202,10 @@ class BacktestResult(Base):
     run_id = Column(String(128), nullable=False)
     start_date = Column(Date, nullable=False)
     end_date = Column(Date, nullable=False)
-    sharpe = Column(N_PRICE)
-    max_drawdown = Column(N_PRICE)
-    total_return = Column(N_PRICE)
-    parameters_json = Column(Text)
+    sharpe = Column(N_STAT)
+    max_drawdown = Column(N_STAT)
+    total_return = Column(N_STAT)
+    parameters_json = Column(JSON)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
 
@@ -191,7 +244,11 @@ class FinancialsBalanceSheet(Base):
 
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
-    __table_args__ = (UniqueConstraint("company_id", "fiscal_year", "fiscal_quarter", name="uq_bs_company_fy_fq"),)
+    __table_args__ = (
+        UniqueConstraint("company_id", "fiscal_year", "fiscal_quarter", name="uq_bs_company_fy_fq"),
+        # conflict target for the INSERT IGNORE bulk load (one row per company and report date)
+        UniqueConstraint("company_id", "report_date", name="uq_bs_company_report"),
+    )
 
 
 class FinancialsIncomeStatement(Base):
@@ -215,7 +272,10 @@ class FinancialsIncomeStatement(Base):
 
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
-    __table_args__ = (UniqueConstraint("company_id", "fiscal_year", "fiscal_quarter", name="uq_is_company_fy_fq"),)
+    __table_args__ = (
+        UniqueConstraint("company_id", "fiscal_year", "fiscal_quarter", name="uq_is_company_fy_fq"),
+        Index("idx_is_company_report", "company_id", "report_date"),
+    )
 
 
 class FinancialsCashflow(Base):
@@ -234,7 +294,10 @@ class FinancialsCashflow(Base):
 
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
-    __table_args__ = (UniqueConstraint("company_id", "fiscal_year", "fiscal_quarter", name="uq_cf_company_fy_fq"),)
+    __table_args__ = (
+        UniqueConstraint("company_id", "fiscal_year", "fiscal_quarter", name="uq_cf_company_fy_fq"),
+        Index("idx_cf_company_report", "company_id", "report_date"),
+    )
 
 
 class FinancialRatio(Base):
@@ -258,7 +321,10 @@ class FinancialRatio(Base):
 
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
-    __table_args__ = (UniqueConstraint("company_id", "fiscal_year", "fiscal_quarter", name="uq_ratios_company_fy_fq"),)
+    __table_args__ = (
+        UniqueConstraint("company_id", "fiscal_year", "fiscal_quarter", name="uq_ratios_company_fy_fq"),
+        Index("idx_ratios_company_report", "company_id", "report_date"),
+    )
 
 
 # Optional enterprise tables
@@ -280,7 +346,7 @@ class ModelVersion(Base):
     model_type = Column(String(64), nullable=False)
     train_start = Column(Date)
     train_end = Column(Date)
-    hyperparams_json = Column(Text)
+    hyperparams_json = Column(JSON)
     notes = Column(Text)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
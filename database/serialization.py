@@ -0,0 +1,20 @@
+# database/serialization.py
+# Binary codecs for large array columns (CovarianceMatrix.matrix_blob).
+# Arrays are stored as zstd-compressed raw bytes; shape/dtype live in sibling columns,
+# so decoding is a decompress + np.frombuffer with no text parsing.
+
+import numpy as np
+import zstandard
+
+ZSTD_LEVEL = 3
+
+
+def pack_matrix(arr: np.ndarray) -> bytes:
+    """Compress the C-order bytes of a matrix for storage in a LONGBLOB column."""
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(np.ascontiguousarray(arr).tobytes())
+
+
+def unpack_matrix(blob: bytes, num_assets: int, dtype: str = "float64") -> np.ndarray:
+    """Inverse of pack_matrix: returns a (num_assets, num_assets) array."""
+    raw = zstandard.ZstdDecompressor().decompress(blob)
+    return np.frombuffer(raw, dtype=dtype).reshape(num_assets, num_assets)
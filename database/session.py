@@ -1,8 +1,32 @@
+import orjson
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, scoped_session, declarative_base
 from .config import DATABASE_URL
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True, future=True)
+
+def _json_dumps(obj) -> str:
+    # JSON columns (weights/parameters/hyperparams) are encoded with orjson: native float and numpy support
+    return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+
+
+engine = create_engine(
+    DATABASE_URL,
+    pool_pre_ping=True,
+    future=True,
+    json_serializer=_json_dumps,
+    json_deserializer=orjson.loads,
+)
+
+# Bulk sections (exports, set-based updates) check out one connection for a long block of work and
+# handle errors themselves: no pre-ping round-trip per checkout, and a small pool of their own
+bulk_engine = create_engine(
+    DATABASE_URL,
+    pool_pre_ping=False,
+    pool_size=2,
+    future=True,
+    json_serializer=_json_dumps,
+    json_deserializer=orjson.loads,
+)
 
 SessionLocal = scoped_session(sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True))
 
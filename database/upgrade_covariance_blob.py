@@ -0,0 +1,58 @@
+# database/upgrade_covariance_blob.py
+# One-off upgrade of covariance_matrices from matrix_json (LONGTEXT) to matrix_blob (zstd LONGBLOB) + dtype.
+# Fresh installs get the new layout from schema.sql; run this once on databases created before it:
+#     python -m database.upgrade_covariance_blob
+# Idempotent: columns are only added/dropped if needed, and matrix_json is dropped only once every row
+# has been re-encoded (a row that fails to decode aborts before the drop, leaving matrix_json intact).
+
+import json
+
+import numpy as np
+from sqlalchemy import text
+
+from database.session import engine
+from database.serialization import pack_matrix
+
+COLUMNS = text("""
+    SELECT column_name FROM information_schema.columns
+    WHERE table_schema = DATABASE() AND table_name = 'covariance_matrices'
+""")
+
+
+def existing_columns(conn) -> set:
+    return {name.lower() for (name,) in conn.execute(COLUMNS)}
+
+
+def upgrade():
+    with engine.begin() as conn:
+        cols = existing_columns(conn)
+        if "matrix_blob" not in cols:
+            conn.execute(text("ALTER TABLE covariance_matrices ADD COLUMN matrix_blob LONGBLOB NULL AFTER num_assets"))
+        if "dtype" not in cols:
+            conn.execute(text(
+                "ALTER TABLE covariance_matrices ADD COLUMN dtype VARCHAR(16) NOT NULL DEFAULT 'float64' AFTER matrix_blob"
+            ))
+        if "matrix_json" not in cols:
+            print("covariance_matrices already upgraded")
+            return
+
+        rows = conn.execute(text(
+            "SELECT id, num_assets, matrix_json FROM covariance_matrices WHERE matrix_blob IS NULL"
+        )).all()
+        for row_id, num_assets, matrix_json in rows:
+            arr = np.asarray(json.loads(matrix_json), dtype=np.float64)
+            if arr.shape != (num_assets, num_assets):
+                raise ValueError(f"covariance_matrices.id={row_id}: shape {arr.shape}, expected {num_assets}x{num_assets}")
+            conn.execute(
+                text("UPDATE covariance_matrices SET matrix_blob = :blob, dtype = 'float64' WHERE id = :id"),
+                {"blob": pack_matrix(arr), "id": row_id},
+            )
+        print(f"Re-encoded {len(rows)} covariance matrices")
+
+    # DDL commits implicitly in MySQL: only reached after every row above was converted
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE covariance_matrices MODIFY matrix_blob LONGBLOB NOT NULL, DROP COLUMN matrix_json"))
+
+
+if __name__ == "__main__":
+    upgrade()
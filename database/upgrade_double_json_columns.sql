@@ -0,0 +1,36 @@
+-- One-off upgrade of an existing database to the DOUBLE statistic columns and native JSON columns
+-- (see N_STAT and the JSON columns in Models.py). Fresh installs get these types from schema.sql;
+-- run this once on databases created before them:
+--   mysql -u spo_user -p spo_db < database/upgrade_double_json_columns.sql
+-- MODIFY rebuilds each table. LONGTEXT -> JSON fails on any row that is not valid JSON: fix those first, e.g.
+--   SELECT id FROM optimized_portfolios WHERE JSON_VALID(weights_json) = 0;
+USE `spo_db`;
+
+-- statistics: DECIMAL(24,6) -> DOUBLE (N_STAT)
+ALTER TABLE features_daily
+    MODIFY return_1d DOUBLE,
+    MODIFY return_5d DOUBLE,
+    MODIFY return_10d DOUBLE,
+    MODIFY return_21d DOUBLE,
+    MODIFY volatility_10d DOUBLE,
+    MODIFY volatility_20d DOUBLE,
+    MODIFY volatility_60d DOUBLE,
+    MODIFY momentum_14d DOUBLE,
+    MODIFY volume_change_5d DOUBLE;
+
+ALTER TABLE model_predictions
+    MODIFY predicted_return DOUBLE;
+
+-- backtest metrics: DECIMAL(24,6) -> DOUBLE, parameters LONGTEXT -> JSON
+ALTER TABLE backtest_results
+    MODIFY sharpe DOUBLE,
+    MODIFY max_drawdown DOUBLE,
+    MODIFY total_return DOUBLE,
+    MODIFY parameters_json JSON;
+
+-- JSON payloads: LONGTEXT -> JSON
+ALTER TABLE optimized_portfolios
+    MODIFY weights_json JSON NOT NULL;
+
+ALTER TABLE model_versions
+    MODIFY hyperparams_json JSON;
@@ -0,0 +1,50 @@
+-- One-off upgrade of an existing database to the partitioned price_history (see schema.sql, 3. price_history).
+-- Fresh installs get this from schema.sql; run this once on databases created before partitioning:
+--   mysql -u spo_user -p spo_db < database/upgrade_price_history_partitioning.sql
+-- The PK change and the partitioning each rebuild the table: run it in a maintenance window.
+USE `spo_db`;
+
+-- 1. partitioned InnoDB tables cannot have foreign keys
+ALTER TABLE price_history DROP FOREIGN KEY fk_price_company;
+
+-- 2. every unique key must include the partitioning column (id stays first, so AUTO_INCREMENT remains valid)
+ALTER TABLE price_history DROP PRIMARY KEY, ADD PRIMARY KEY (id, trade_date);
+
+-- 3. yearly RANGE partitions on trade_date (same layout as schema.sql / PRICE_PARTITIONS in Models.py)
+ALTER TABLE price_history
+PARTITION BY RANGE (TO_DAYS(trade_date)) (
+    PARTITION p2000 VALUES LESS THAN (TO_DAYS('2001-01-01')),
+    PARTITION p2001 VALUES LESS THAN (TO_DAYS('2002-01-01')),
+    PARTITION p2002 VALUES LESS THAN (TO_DAYS('2003-01-01')),
+    PARTITION p2003 VALUES LESS THAN (TO_DAYS('2004-01-01')),
+    PARTITION p2004 VALUES LESS THAN (TO_DAYS('2005-01-01')),
+    PARTITION p2005 VALUES LESS THAN (TO_DAYS('2006-01-01')),
+    PARTITION p2006 VALUES LESS THAN (TO_DAYS('2007-01-01')),
+    PARTITION p2007 VALUES LESS THAN (TO_DAYS('2008-01-01')),
+    PARTITION p2008 VALUES LESS THAN (TO_DAYS('2009-01-01')),
+    PARTITION p2009 VALUES LESS THAN (TO_DAYS('2010-01-01')),
+    PARTITION p2010 VALUES LESS THAN (TO_DAYS('2011-01-01')),
+    PARTITION p2011 VALUES LESS THAN (TO_DAYS('2012-01-01')),
+    PARTITION p2012 VALUES LESS THAN (TO_DAYS('2013-01-01')),
+    PARTITION p2013 VALUES LESS THAN (TO_DAYS('2014-01-01')),
+    PARTITION p2014 VALUES LESS THAN (TO_DAYS('2015-01-01')),
+    PARTITION p2015 VALUES LESS THAN (TO_DAYS('2016-01-01')),
+    PARTITION p2016 VALUES LESS THAN (TO_DAYS('2017-01-01')),
+    PARTITION p2017 VALUES LESS THAN (TO_DAYS('2018-01-01')),
+    PARTITION p2018 VALUES LESS THAN (TO_DAYS('2019-01-01')),
+    PARTITION p2019 VALUES LESS THAN (TO_DAYS('2020-01-01')),
+    PARTITION p2020 VALUES LESS THAN (TO_DAYS('2021-01-01')),
+    PARTITION p2021 VALUES LESS THAN (TO_DAYS('2022-01-01')),
+    PARTITION p2022 VALUES LESS THAN (TO_DAYS('2023-01-01')),
+    PARTITION p2023 VALUES LESS THAN (TO_DAYS('2024-01-01')),
+    PARTITION p2024 VALUES LESS THAN (TO_DAYS('2025-01-01')),
+    PARTITION p2025 VALUES LESS THAN (TO_DAYS('2026-01-01')),
+    PARTITION p2026 VALUES LESS THAN (TO_DAYS('2027-01-01')),
+    PARTITION p2027 VALUES LESS THAN (TO_DAYS('2028-01-01')),
+    PARTITION pmax VALUES LESS THAN MAXVALUE
+);
+
+-- 4. replaces the dropped ON DELETE CASCADE: deleting a company deletes its price rows
+DROP TRIGGER IF EXISTS trg_companies_delete_prices;
+CREATE TRIGGER trg_companies_delete_prices BEFORE DELETE ON companies
+FOR EACH ROW DELETE FROM price_history WHERE company_id = OLD.id;
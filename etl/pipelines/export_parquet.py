@@ -0,0 +1,150 @@
+"""
+Export hot analytics tables (price_history, features_daily) from MySQL to Parquet.
+
+MySQL stays the source of truth for OLTP/updates; this materializes a columnar copy
+for bulk analytics (covariance, features, backtests) which only need a few columns
+over many symbols x dates:
+- data/analytics/price_history/year=YYYY/symbol=XXX/part-*.parquet
+- data/analytics/features_daily/year=YYYY/symbol=XXX/part-*.parquet
+Files are ZSTD-compressed and dictionary-encoded. The Hive layout lets readers prune
+on year/symbol (see read_prices, or DuckDB/Polars over the same directory, e.g.
+SELECT ... FROM read_parquet('data/analytics/price_history/**/*.parquet', hive_partitioning=1)).
+
+Usage:
+    python etl/pipelines/export_parquet.py
+"""
+
+import sys
+import datetime
+from pathlib import Path
+from typing import List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+# Ensure project root
+if __name__ == "__main__":
+    root = Path(__file__).resolve().parents[2]
+    if str(root) not in sys.path:
+        sys.path.append(str(root))
+
+from etl.utils.logger import get_logger
+from database.session import bulk_engine
+
+logger = get_logger("etl.export_parquet")
+
+EXPORT_DIR = Path("data/analytics")
+READ_CHUNK = 100_000
+
+PARTITIONING = ds.partitioning(pa.schema([("year", pa.int16()), ("symbol", pa.string())]), flavor="hive")
+FILE_OPTIONS = ds.ParquetFileFormat().make_write_options(compression="zstd", compression_level=3, use_dictionary=True)
+
+# table -> (SELECT producing the export columns, arrow schema of those columns)
+EXPORTS = {
+    "price_history": (
+        """
+        SELECT ph.company_id, c.symbol, ph.trade_date, YEAR(ph.trade_date) AS year,
+               ph.open, ph.high, ph.low, ph.close, ph.adj_close, ph.volume
+        FROM price_history ph
+        JOIN companies c ON c.id = ph.company_id
+        """,
+        pa.schema([
+            ("company_id", pa.int32()),
+            ("symbol", pa.string()),
+            ("trade_date", pa.date32()),
+            ("year", pa.int16()),
+            ("open", pa.float64()),
+            ("high", pa.float64()),
+            ("low", pa.float64()),
+            ("close", pa.float64()),
+            ("adj_close", pa.float64()),
+            ("volume", pa.int64()),
+        ]),
+    ),
+    "features_daily": (
+        """
+        SELECT f.company_id, c.symbol, f.feature_date, YEAR(f.feature_date) AS year,
+               f.return_1d, f.return_5d, f.return_10d, f.return_21d,
+               f.volatility_10d, f.volatility_20d, f.volatility_60d,
+               f.momentum_14d, f.volume_change_5d
+        FROM features_daily f
+        JOIN companies c ON c.id = f.company_id
+        """,
+        pa.schema([
+            ("company_id", pa.int32()),
+            ("symbol", pa.string()),
+            ("feature_date", pa.date32()),
+            ("year", pa.int16()),
+            ("return_1d", pa.float64()),
+            ("return_5d", pa.float64()),
+            ("return_10d", pa.float64()),
+            ("return_21d", pa.float64()),
+            ("volatility_10d", pa.float64()),
+            ("volatility_20d", pa.float64()),
+            ("volatility_60d", pa.float64()),
+            ("momentum_14d", pa.float64()),
+            ("volume_change_5d", pa.float64()),
+        ]),
+    ),
+}
+
+
+def iter_batches(conn, sql: str, schema: pa.Schema):
+    """Stream query results as arrow record batches (server-side cursor, READ_CHUNK rows at a time)."""
+    for chunk in pd.read_sql(sql, conn, chunksize=READ_CHUNK):
+        yield from pa.Table.from_pandas(chunk, schema=schema, preserve_index=False).to_batches()
+
+
+def export_table(table: str) -> Path:
+    """Rewrite the Parquet dataset for one table; returns its directory."""
+    sql, schema = EXPORTS[table]
+    out_dir = EXPORT_DIR / table
+    with bulk_engine.connect().execution_options(stream_results=True) as conn:
+        ds.write_dataset(
+            iter_batches(conn, sql, schema),
+            out_dir,
+            schema=schema,
+            format="parquet",
+            partitioning=PARTITIONING,
+            file_options=FILE_OPTIONS,
+            basename_template="part-{i}.parquet",
+            existing_data_behavior="delete_matching",
+        )
+    logger.info("Exported %s to %s", table, out_dir)
+    return out_dir
+
+
+def read_prices(
+    start: datetime.date,
+    end: datetime.date,
+    columns: Optional[List[str]] = None,
+    symbols: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """
+    Read exported price_history for [start, end], only the requested columns.
+    Year/symbol filters prune partition directories; trade_date is pushed down to row groups.
+    """
+    dataset = ds.dataset(EXPORT_DIR / "price_history", format="parquet", partitioning=PARTITIONING)
+    flt = (
+        (ds.field("year") >= start.year)
+        & (ds.field("year") <= end.year)
+        & (ds.field("trade_date") >= start)
+        & (ds.field("trade_date") <= end)
+    )
+    if symbols:
+        flt = flt & ds.field("symbol").isin(symbols)
+    cols = columns or ["company_id", "symbol", "trade_date", "adj_close"]
+    return dataset.to_table(columns=cols, filter=flt).to_pandas()
+
+
+def main():
+    for table in EXPORTS:
+        try:
+            export_table(table)
+        except Exception as e:
+            logger.exception("Export of %s failed: %s", table, e)
+
+
+if __name__ == "__main__":
+    main()
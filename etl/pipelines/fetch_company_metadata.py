@@ -10,21 +10,31 @@ Auto-discovery Company Metadata ETL (Moneycontrol / yfinance)
     python etl/pipelines/fetch_company_metadata.py
 """
 
-import time
+import re
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import Optional
 import requests
-from bs4 import BeautifulSoup
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+import diskcache
+from requests.adapters import HTTPAdapter
+import lxml.html
+from lxml import etree
+import pybreaker
+from tenacity import retry, stop_after_attempt, wait_random_exponential, retry_if_exception_type
 import yfinance as yf
 import pandas as pd
 import datetime
+from sqlalchemy import select, update
 
 
 try:
     from etl.utils.logger import get_logger
     from etl.utils.db import get_session
+    from etl.utils.ratelimit import RateLimiter
+    from etl.utils.http import YF_SESSION
+    from etl.utils.iterutils import chunk_list
     from database.Models import Company
 except Exception:
     # if running as script by path, try to add project root to sys.path (safe fallback)
@@ -32,12 +42,21 @@ except Exception:
     sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
     from etl.utils.logger import get_logger
     from etl.utils.db import get_session
+    from etl.utils.ratelimit import RateLimiter
+    from etl.utils.http import YF_SESSION
+    from etl.utils.iterutils import chunk_list
     from database.Models import Company
 
 logger = get_logger("etl.fetch_company_metadata")
 
 # Fallback CSV (developer-provided)
 FALLBACK_COMPANIES_CSV = Path("/mnt/data/companies.csv")
+CSV_COLUMNS = ["symbol", "name", "sector", "industry"]
+
+# Persistent response cache (yfinance info, Moneycontrol search/profile) so re-runs skip the network
+CACHE_DIR = Path("data/cache/metadata")
+CACHE_TTL = 7 * 24 * 3600
+CACHE = diskcache.Cache(str(CACHE_DIR))
 
 # Moneycontrol constants (best-effort)
 MONEYCONTROL_BASE = "https://www.moneycontrol.com"
@@ -48,63 +67,100 @@ HEADERS = {
     "Referer": MONEYCONTROL_BASE,
 }
 
+# Shared pooled session: keep-alive + TLS reuse across scrape requests (and worker threads)
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=0))
+SESSION.headers.update(HEADERS)
+
 # How many seconds to wait between requests (politeness)
 REQUEST_PAUSE = 0.8
 
-# Retry config for network ops
-retry_network = retry(stop=stop_after_attempt(5), wait=wait_exponential(multiplier=1, min=1, max=10),
+# yfinance lookups run concurrently (network-bound); token buckets keep each host polite
+MAX_WORKERS = 16
+FETCH_BATCH_SIZE = 50
+YF_LIMITER = RateLimiter(rate=5, per=1.0)
+MC_LIMITER = RateLimiter(rate=1, per=REQUEST_PAUSE)
+# At most this many Moneycontrol scrapes in flight at once (their latency overlaps, the limiter sets the pace)
+MC_SEMAPHORE = threading.Semaphore(4)
+
+# Records with all of these populated are skipped before any network call
+METADATA_FIELDS = ("name", "sector", "industry", "isin")
+
+# Company updates are buffered and written with one bulk UPDATE per this many rows
+UPDATE_BATCH_SIZE = 1000
+
+# Profile labels -> result field, extracted with one regex pass over the page text
+LABEL_FIELDS = {
+    "Sector": "sector",
+    "Industry": "industry",
+    "ISIN": "isin",
+    "Listing Date": "listing_date",
+    "Date of Listing": "listing_date",
+    "Listed On": "listing_date",
+}
+LABEL_RE = re.compile(r"\b(Sector|Industry|ISIN|Listing Date|Date of Listing|Listed On)\b[\s:|]*([^|]{1,128})")
+
+# Retry config for network ops (jittered backoff so concurrent workers don't retry in lockstep)
+retry_network = retry(stop=stop_after_attempt(5), wait=wait_random_exponential(multiplier=1, max=10),
                       retry=retry_if_exception_type((requests.exceptions.RequestException,)))
 
+# Per-host circuit breaker for Moneycontrol: after 10 consecutive failed requests calls fail fast
+# (CircuitBreakerError, not retried) for 60s instead of spending the retry budget on every symbol
+MC_BREAKER = pybreaker.CircuitBreaker(fail_max=10, reset_timeout=60)
+
 
 def read_symbols_from_db(session):
     """
-    Return list of (id, symbol, name, sector, industry) for companies table
+    Return list of dicts (id, symbol, name, sector, industry, isin, listing_date) for companies table.
+    Selects only the needed columns (plain rows, no ORM objects) and streams them.
+    The current values are what the update path compares against, so no per-company re-read is needed.
     """
-    rows = session.query(Company).all()
-    result = []
-    for r in rows:
-        result.append({
-            "id": r.id,
-            "symbol": r.symbol,
-            "name": r.name,
-            "sector": r.sector,
-            "industry": r.industry,
-        })
-    return result
+    stmt = (
+        select(
+            Company.id, Company.symbol, Company.name, Company.sector, Company.industry,
+            Company.isin, Company.listing_date,
+        )
+        .execution_options(stream_results=True, yield_per=1000)
+    )
+    return [dict(r._mapping) for r in session.execute(stmt)]
 
 
 def read_symbols_from_csv(path=FALLBACK_COMPANIES_CSV):
     """
-    Fallback: read uploaded CSV (expects column 'symbol')
+    Fallback: read uploaded CSV (expects column 'symbol'; name/sector/industry optional)
     """
     if not path.exists():
         logger.error("Fallback CSV not found: %s", path)
         return []
-    df = pd.read_csv(path)
+    df = pd.read_csv(path, usecols=lambda c: c in CSV_COLUMNS, dtype=str)
     if "symbol" not in df.columns:
         logger.error("Fallback CSV missing 'symbol' column")
         return []
-    symbols = []
-    for _, row in df.iterrows():
-        symbols.append({
-            "id": None,
-            "symbol": str(row["symbol"]).strip(),
-            "name": row.get("name"),
-            "sector": row.get("sector"),
-            "industry": row.get("industry"),
-        })
+    df = df.reindex(columns=CSV_COLUMNS).dropna(subset=["symbol"])
+    df["symbol"] = df["symbol"].str.strip()
+    df = df.astype(object).where(df.notna(), None)
+    symbols = df.assign(id=None).to_dict("records")
     logger.info("Loaded %d symbols from fallback CSV", len(symbols))
     return symbols
 
 
+@CACHE.memoize(expire=CACHE_TTL, tag="yfinance")
+def fetch_ticker_info(symbol: str) -> dict:
+    """
+    Raw yfinance info dict over the shared session. Cached on disk per symbol so re-runs
+    don't download it again; errors propagate (and are not cached).
+    """
+    YF_LIMITER.acquire()
+    return yf.Ticker(symbol, session=YF_SESSION).get_info() or {}
+
+
 def safe_get_ticker_info(symbol: str) -> dict:
     """
     Use yfinance to get info. Returns dict possibly containing:
     longName, sector, industry, isin, website
     """
     try:
-        t = yf.Ticker(symbol)
-        info = t.info or {}
+        info = fetch_ticker_info(symbol)
         # Keep only relevant keys
         return {
             "name": info.get("longName") or info.get("shortName") or None,
@@ -119,7 +175,9 @@ def safe_get_ticker_info(symbol: str) -> dict:
         return {}
 
 
+@CACHE.memoize(expire=CACHE_TTL, tag="moneycontrol")
 @retry_network
+@MC_BREAKER
 def moneycontrol_search(symbol_no_ns: str) -> Optional[str]:
     """
     Best-effort: use Moneycontrol search to find a profile URL.
@@ -131,13 +189,12 @@ def moneycontrol_search(symbol_no_ns: str) -> Optional[str]:
     q = symbol_no_ns
     search_url = f"{MONEYCONTROL_BASE}/g/search?q={q}"
     # Note: Moneycontrol uses dynamic content; this endpoint returns HTML with links we can parse.
-    resp = requests.get(search_url, headers=HEADERS, timeout=12)
+    MC_LIMITER.acquire()
+    resp = SESSION.get(search_url, timeout=12)
     resp.raise_for_status()
-    soup = BeautifulSoup(resp.text, "html.parser")
+    tree = lxml.html.fromstring(resp.content)
     # find first <a> that looks like a company profile (heuristic)
-    anchors = soup.find_all("a", href=True)
-    for a in anchors:
-        href = a["href"]
+    for href in tree.xpath("//a/@href"):
         if "/company" in href or "/india/stockpricequote" in href or "/stocks/companyinfo" in href:
             # normalize
             if href.startswith("http"):
@@ -147,75 +204,128 @@ def moneycontrol_search(symbol_no_ns: str) -> Optional[str]:
     return None
 
 
-@retry_network
-def moneycontrol_scrape_profile(url: str) -> dict:
+class ProfileCollector:
     """
-    Scrape profile page for name, sector, industry, isin, listing date (best-effort).
-    Returns dict with keys similar to yfinance fallback.
+    lxml parser target for profile pages. Receives start/end/data events as the page
+    streams in and keeps only what the scraper needs: the first <h1> text, the
+    og:title meta content and the visible text strings (script/style skipped),
+    i.e. what get_text(separator="|", strip=True) used to be built from.
     """
+
+    def __init__(self):
+        self.h1 = None
+        self.og_title = None
+        self.strings = []
+        self._buf = []
+        self._skip = 0
+        self._in_h1 = False
+        self._h1_parts = []
+
+    def _flush(self):
+        if self._buf:
+            s = "".join(self._buf).strip()
+            if s:
+                self.strings.append(s)
+            self._buf = []
+
+    def start(self, tag, attrib):
+        self._flush()
+        if tag in ("script", "style"):
+            self._skip += 1
+        elif tag == "h1" and self.h1 is None:
+            self._in_h1 = True
+        elif tag == "meta" and self.og_title is None and attrib.get("property") == "og:title":
+            self.og_title = attrib.get("content")
+
+    def end(self, tag):
+        self._flush()
+        if tag in ("script", "style"):
+            self._skip = max(self._skip - 1, 0)
+        elif tag == "h1" and self._in_h1:
+            self._in_h1 = False
+            self.h1 = "".join(self._h1_parts).strip()
+
+    def data(self, data):
+        if self._skip:
+            return
+        self._buf.append(data)
+        if self._in_h1:
+            self._h1_parts.append(data)
+
+    def close(self):
+        self._flush()
+        return self
+
+
+@retry_network
+@MC_BREAKER
+def fetch_profile_html(url: str) -> bytes:
+    """Download a Moneycontrol profile page (network stage of the scrape)."""
     logger.debug("Scraping Moneycontrol profile: %s", url)
-    resp = requests.get(url, headers=HEADERS, timeout=12)
+    MC_LIMITER.acquire()
+    resp = SESSION.get(url, timeout=12)
     resp.raise_for_status()
-    soup = BeautifulSoup(resp.text, "html.parser")
+    return resp.content
+
+
+def extract_profile_fields(html: bytes) -> dict:
+    """
+    Parse profile page bytes for name, sector, industry, isin, listing date (best-effort).
+    Pure CPU stage of the scrape, run inline on the fetching thread (pages are throttled by
+    MC_LIMITER, so parsing is never the bottleneck). Returns dict with keys similar to yfinance fallback.
+    """
+    # SAX-style parser target: no DOM is built
+    parser = etree.HTMLParser(target=ProfileCollector())
+    parser.feed(html)
+    page = parser.close()
 
     # heuristics:
     result = {"name": None, "sector": None, "industry": None, "isin": None, "listing_date": None, "source": "moneycontrol"}
 
     # Company name: look for <h1> or meta og:title
-    h1 = soup.find("h1")
-    if h1 and h1.text.strip():
-        result["name"] = h1.text.strip()
-    else:
-        og = soup.find("meta", property="og:title")
-        if og and og.get("content"):
-            result["name"] = og["content"].strip()
+    if page.h1:
+        result["name"] = page.h1
+    elif page.og_title and page.og_title.strip():
+        result["name"] = page.og_title.strip()
 
     # Sector/industry: many pages have a table or breadcrumbs
     # Find key: "Sector" or "Industry" labels in page content
-    text = soup.get_text(separator="|", strip=True)
-    # quick heuristics
-    for token in ["Sector:", "Sector", "Industry:", "Industry"]:
-        if token in text:
-            # crude attempt to extract
-            try:
-                parts = text.split(token, 1)[1]
-                # take few words
-                candidate = parts.split("|", 1)[0].strip()
-                if token.startswith("Sector") and not result["sector"]:
-                    result["sector"] = candidate
-                elif token.startswith("Industry") and not result["industry"]:
-                    result["industry"] = candidate
-            except Exception:
-                pass
-
-    # ISIN: look for 'ISIN' substring
-    if "ISIN" in text:
-        try:
-            after = text.split("ISIN", 1)[1]
-            candidate = after.split("|", 1)[0]
-            candidate = candidate.strip().strip(":").strip()
+    text = "|".join(page.strings)
+    # single pass over the text for all labels; first plausible value per field wins
+    for m in LABEL_RE.finditer(text):
+        field = LABEL_FIELDS[m.group(1)]
+        if result[field]:
+            continue
+        candidate = m.group(2).strip()
+        if field == "isin":
             # basic filter
-            if len(candidate) >= 8:
-                result["isin"] = candidate
-        except Exception:
-            pass
-
-    # Listing date: look for 'Listing Date' or 'Date of Listing'
-    for label in ["Listing Date", "Date of Listing", "Listed On"]:
-        if label in text and not result["listing_date"]:
+            if len(candidate) < 8:
+                continue
+        elif field == "listing_date":
             try:
-                after = text.split(label, 1)[1]
-                candidate = after.split("|", 1)[0].strip()
-                # try parse
-                try:
-                    dt = pd.to_datetime(candidate, errors="coerce")
-                    if pd.notna(dt):
-                        result["listing_date"] = dt.date().isoformat()
-                except Exception:
-                    pass
+                dt = pd.to_datetime(candidate, errors="coerce")
             except Exception:
-                pass
+                continue
+            if pd.isna(dt):
+                continue
+            candidate = dt.date().isoformat()
+        result[field] = candidate
+        # every label field found: skip scanning the rest of the (often very long) page text
+        if all(result[f] for f in LABEL_FIELDS.values()):
+            break
+
+    return result
+
 
+def moneycontrol_scrape_profile(url: str) -> dict:
+    """Scrape profile page (see extract_profile_fields); results are cached on disk per url."""
+    key = ("moneycontrol_profile", url)
+    result = CACHE.get(key)
+    if result is not None:
+        return result
+    html = fetch_profile_html(url)
+    result = extract_profile_fields(html)
+    CACHE.set(key, result, expire=CACHE_TTL, tag="moneycontrol")
     return result
 
 
@@ -231,56 +341,76 @@ def merge_metadata(current: dict, new: dict) -> dict:
     return out
 
 
-def update_company_in_db(session, company_id: int, updates: dict):
+def pending_company_update(record: dict, updates: dict) -> Optional[dict]:
+    """
+    Build the UPDATE row for a company record (as read by read_symbols_from_db):
+    only columns that are currently null or empty in the record.
+    Returns {"id": record id, <column>: <value>, ...} or None if nothing would change.
+    Rows are written in bulk by flush_company_updates().
+    """
+    row = {}
+    for k, v in updates.items():
+        if v is None:
+            continue
+        # only update if current is null or empty
+        cur = record.get(k)
+        if cur is None or (isinstance(cur, str) and cur.strip() == ""):
+            row[k] = v
+    if not row:
+        return None
+    row["id"] = record["id"]
+    return row
+
+
+def flush_company_updates(session, rows: list) -> int:
     """
-    Update only specified columns for a given company id.
+    Write buffered UPDATE rows with one bulk UPDATE-by-primary-key and a single commit.
     """
-    if not updates:
-        return False
+    if not rows:
+        return 0
     try:
-        company = session.query(Company).get(company_id)
-        if not company:
-            return False
-        changed = False
-        for k, v in updates.items():
-            if v is None:
-                continue
-            # only update if current is null or empty
-            cur = getattr(company, k, None)
-            if cur is None or (isinstance(cur, str) and cur.strip() == ""):
-                setattr(company, k, v)
-                changed = True
-        if changed:
-            session.add(company)
-            session.commit()
-            logger.info("Updated company id=%s with fields: %s", company_id, list(updates.keys()))
-        return changed
+        session.execute(update(Company), rows)
+        session.commit()
+        logger.info("Updated %d companies", len(rows))
+        return len(rows)
     except Exception as e:
         session.rollback()
-        logger.exception("DB update error for company %s: %s", company_id, e)
-        return False
+        logger.exception("Bulk update failed for %d companies: %s", len(rows), e)
+        return 0
+
+
+def missing_metadata(record: dict) -> list:
+    """Metadata fields still empty for a record; nothing to fetch when this is empty."""
+    return [k for k in METADATA_FIELDS if not record.get(k)]
 
 
-def process_single(session, record):
+def process_single(record):
     """
-    record: dict with keys id, symbol, name, sector, industry
+    record: dict with keys id, symbol, name, sector, industry, isin, listing_date
+    Returns the pending UPDATE row for the company (see pending_company_update) or None.
+    Touches no DB state, so main() runs it on worker threads.
     """
     symbol = record["symbol"]
     company_id = record.get("id")  # may be None if from CSV fallback
 
+    # already hydrated -> no network calls at all
+    missing = missing_metadata(record)
+    if not missing:
+        return None
+
     # normalize symbol to yfinance form (if not already)
     symbol = symbol.strip()
     # try yfinance
     info = safe_get_ticker_info(symbol)
-    time.sleep(REQUEST_PAUSE)
-    # if yfinance lacks sector/name -> try moneycontrol
-    if not info.get("name") or not info.get("sector") or not info.get("industry"):
+    # if yfinance lacks a still-missing sector/name/industry -> try moneycontrol
+    if any(not info.get(k) for k in missing if k in ("name", "sector", "industry")):
         # prepare moneycontrol token: strip .NS if present
         token = symbol.replace(".NS", "").replace(".BO", "").replace(".BSE", "")
         try:
-            url = moneycontrol_search(token)
-            if url:
-                mc = moneycontrol_scrape_profile(url)
+            with MC_SEMAPHORE:
+                url = moneycontrol_search(token)
+                mc = moneycontrol_scrape_profile(url) if url else None
+            if mc:
                 # merge mc into info without overwriting good data
                 info = merge_metadata(info, mc)
         except Exception as e:
@@ -299,12 +429,11 @@ def process_single(session, record):
     updates = {k: v for k, v in updates.items() if v is not None and v != ""}
 
     if company_id:
-        updated = update_company_in_db(session, company_id, updates)
-        return updated
+        return pending_company_update(record, updates)
     else:
         # no company id (CSV fallback) - write to CSV (or log)
         logger.info("No DB id for %s — would update (simulated): %s", symbol, updates)
-        return False
+        return None
 
 
 def main():
@@ -327,19 +456,32 @@ def main():
         logger.error("No symbols to process. Exit.")
         return
 
-    logger.info("Starting metadata fetch for %d symbols", len(symbols))
+    total = len(symbols)
+    symbols = [rec for rec in symbols if missing_metadata(rec)]
+    logger.info("Starting metadata fetch for %d symbols (%d already complete, skipped)", len(symbols), total - len(symbols))
 
-    # iterate and process
+    # records are fetched and parsed concurrently (yfinance + Moneycontrol fallback) on threads;
+    # DB writes stay on this thread
     processed = 0
-    for rec in symbols:
-        try:
-            process_single(session, rec)
-            processed += 1
-        except Exception as e:
-            logger.exception("Failed processing %s: %s", rec.get("symbol"), e)
-        time.sleep(0.5)  # small pause between companies
-
-    logger.info("Metadata ETL complete: processed %d symbols", processed)
+    updated = 0
+    pending = []
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        for batch in chunk_list(symbols, FETCH_BATCH_SIZE):
+            futures = {pool.submit(process_single, rec): rec for rec in batch}
+            for fut in as_completed(futures):
+                try:
+                    row = fut.result()
+                    if row:
+                        pending.append(row)
+                    processed += 1
+                except Exception as e:
+                    logger.exception("Failed processing %s: %s", futures[fut].get("symbol"), e)
+            if len(pending) >= UPDATE_BATCH_SIZE:
+                updated += flush_company_updates(session, pending)
+                pending = []
+    updated += flush_company_updates(session, pending)
+
+    logger.info("Metadata ETL complete: processed %d symbols, updated %d companies", processed, updated)
     try:
         if session:
             session.close()
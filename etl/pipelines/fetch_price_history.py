@@ -2,9 +2,9 @@
 """
 Production-grade ETL to fetch historical OHLCV for a universe (NIFTY 500).
 - Reads universe from data/universe/nifty500.txt (one ticker per line, yfinance format)
-- Downloads 5 years of daily data via yfinance
+- Downloads 5 years of daily data via yfinance (only the missing tail when a bronze file exists)
 - Writes raw Parquet to data/bronze/prices/{symbol}.parquet
-- Writes cleaned Parquet to data/silver/prices/{symbol}.parquet
+- Writes cleaned Parquet as one dataset partitioned by symbol: data/silver/prices/symbol={symbol}/part-0.parquet
 - Inserts missing rows into price_history table (idempotent)
 - Logs ETL run in etl_runs
 """
@@ -15,23 +15,37 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".
 from pathlib import Path
 import datetime
 import json
-import time
-from typing import List
+import uuid
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Optional, Tuple
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 import yfinance as yf
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+from yfinance.exceptions import YFRateLimitError
+from curl_cffi.requests.exceptions import RequestException as CurlRequestException
+from requests.exceptions import RequestException
+from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type, before_sleep_log
+from sqlalchemy import insert
 from sqlalchemy.exc import SQLAlchemyError
 
 from etl.utils.logger import get_logger
 from etl.utils.validation import validate_ohlcv
-from etl.utils.db import get_session, ensure_companies, get_existing_dates, log_etl_run
+from etl.utils.db import get_session, ensure_companies, get_latest_dates_bulk, log_etl_run
+from etl.utils.ratelimit import RateLimiter
+from etl.utils.http import YF_SESSION
+from etl.utils.iterutils import chunk_list
 from database.Models import PriceHistory
 
 # config
 ROOT = Path(".")
 UNIVERSE_FILE = ROOT / "Data" / "universe" / "nifty500.txt"
 BRONZE_DIR = ROOT / "Data" / "Bronze" / "prices"
-SILVER_DIR = ROOT / "Data" / "Silver" / "prices"
+# Hive-partitioned silver dataset (symbol=XXX/part-*.parquet). Its own root: the legacy flat per-ticker
+# files in Data/Silver/prices would otherwise sit beside the partitions and be read twice by ds.dataset
+SILVER_DIR = ROOT / "Data" / "Silver" / "prices_ds"
 BRONZE_DIR.mkdir(parents=True, exist_ok=True)
 SILVER_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -40,7 +54,22 @@ logger = get_logger("etl.fetch_price_history")
 YEARS = 5
 END_DATE = datetime.date.today()
 START_DATE = END_DATE - datetime.timedelta(days=365 * YEARS)
-BATCH_SIZE = 25   # chunk tickers to avoid rate limits
+BATCH_SIZE = 20   # Yahoo accepts up to 20 symbols per request
+# batches are downloaded concurrently (network-bound), each batch sequentially inside yf.download
+# (threads=False: one Yahoo request per ticker, and no clash over yfinance's process-global thread setting).
+# The token bucket is charged per ticker, so all workers together stay at ~5 Yahoo requests/sec with at
+# most MAX_WORKERS in flight.
+MAX_WORKERS = 8
+YF_LIMITER = RateLimiter(rate=5, per=1.0)
+# rows before the first new date that are re-validated, so the forward-fill of a new row has context
+VALIDATION_LOOKBACK = datetime.timedelta(days=10)
+
+# yfinance column (index "Date") -> price_history column
+PRICE_COLUMNS = {"Date": "trade_date", "Open": "open", "High": "high", "Low": "low", "Close": "close", "Adj Close": "adj_close", "Volume": "volume"}
+# silver dataset files: same encoding as df_to_parquet
+SILVER_FILE_OPTIONS = ds.ParquetFileFormat().make_write_options(compression="zstd", compression_level=3, use_dictionary=["Volume"])
+# INSERT IGNORE: rows already present (uq_price_company_date) are skipped by MySQL, so no pre-SELECT of existing dates
+INSERT_PRICES = insert(PriceHistory.__table__).prefix_with("IGNORE")
 
 
 def read_universe() -> List[str]:
@@ -54,16 +83,25 @@ def read_universe() -> List[str]:
     return ticks
 
 
-@retry(stop=stop_after_attempt(5), wait=wait_exponential(multiplier=1, min=2, max=30), retry=retry_if_exception_type(Exception))
+# only transient network/rate-limit errors are retried; programming errors surface immediately
+# (yfinance talks to Yahoo through curl_cffi, whose exceptions don't derive from requests')
+RETRYABLE_ERRORS = (RequestException, CurlRequestException, YFRateLimitError, ConnectionError, TimeoutError)
+
+
+@retry(stop=stop_after_attempt(5), wait=wait_exponential(multiplier=1, min=2, max=30), retry=retry_if_exception_type(RETRYABLE_ERRORS),
+       before_sleep=before_sleep_log(logger, logging.WARNING))
 def download_yf(tickers: List[str], start: datetime.date, end: datetime.date) -> dict:
     """
     Uses yfinance.download in batch mode. Returns dict symbol -> DataFrame
     Retries automatically on network errors.
     """
     logger.info("Downloading tickers batch: %s", ", ".join(tickers))
+    # one token per ticker: yf.download issues one request for each
+    for _ in tickers:
+        YF_LIMITER.acquire()
     # yfinance accepts a space-separated list
     joined = " ".join(tickers)
-    df = yf.download(joined, start=start.isoformat(), end=(end + datetime.timedelta(days=1)).isoformat(), group_by="ticker", threads=True, auto_adjust=False, progress=False)
+    df = yf.download(joined, start=start.isoformat(), end=(end + datetime.timedelta(days=1)).isoformat(), group_by="ticker", threads=False, auto_adjust=False, progress=False, session=YF_SESSION)
     results = {}
     if isinstance(df.columns, pd.MultiIndex):
         # multi-ticker
@@ -82,81 +120,193 @@ def download_yf(tickers: List[str], start: datetime.date, end: datetime.date) ->
     return results
 
 
+def latest_cached_date(path: Path) -> Optional[datetime.date]:
+    """Last trade date in a bronze parquet file, read from its footer statistics (no data pages); None if unknown."""
+    if not path.exists():
+        return None
+    try:
+        meta = pq.read_metadata(path)
+        index_col = meta.schema.to_arrow_schema().pandas_metadata["index_columns"][0]
+        ci = meta.schema.names.index(index_col)
+        latest = None
+        for rg in range(meta.num_row_groups):
+            stats = meta.row_group(rg).column(ci).statistics
+            if stats is None or not stats.has_min_max:
+                return None
+            latest = stats.max if latest is None else max(latest, stats.max)
+        return pd.Timestamp(latest).date() if latest is not None else None
+    except Exception as e:
+        logger.warning("Could not read cached date from %s: %s", path, e)
+        return None
+
+
+def merge_cached(path: Path, new: pd.DataFrame) -> pd.DataFrame:
+    """Append a freshly downloaded tail to the cached bronze history (new rows win on overlap)."""
+    cached = pd.read_parquet(path, engine="pyarrow")
+    combined = pd.concat([cached, new])
+    return combined[~combined.index.duplicated(keep="last")].sort_index()
+
+
 def df_to_parquet(df: pd.DataFrame, path: Path):
     path.parent.mkdir(parents=True, exist_ok=True)
-    # store with pyarrow for efficiency
-    df.to_parquet(path, engine="pyarrow", compression="snappy", index=True)
+    # zstd-3: smaller than snappy at similar speed; dictionary encoding only for Volume (unique floats don't benefit)
+    df.to_parquet(
+        path,
+        engine="pyarrow",
+        compression="zstd",
+        compression_level=3,
+        use_dictionary=[c for c in ("Volume",) if c in df.columns],
+        data_page_size=1 << 20,
+        row_group_size=max(len(df), 1),
+        index=True,
+    )
     logger.debug("Wrote parquet %s (%d rows)", path, len(df))
 
 
-def insert_into_db(session, company_id: int, df: pd.DataFrame) -> int:
+def write_silver(cleaned: List[Tuple[str, pa.Table]], replace: bool):
     """
-    Inserts rows from df (index = date, columns: Open, High, Low, Close, Adj Close, Volume)
-    Only inserts rows not already present; returns number of inserted rows
+    Write a batch of cleaned tables into the silver dataset, one Hive partition per symbol.
+    replace=True rewrites each symbol's partition (full history downloads); replace=False adds the rows
+    as a new file next to the existing ones (daily tails). Batches hold disjoint symbols so concurrent
+    writes don't collide.
     """
-    existing = get_existing_dates(session, company_id)
-    inserted = 0
-    to_insert = []
-    for dt, row in df.iterrows():
-        dstr = dt.date().isoformat()
-        if dstr in existing:
-            continue
-        ph = PriceHistory(
-            company_id=company_id,
-            trade_date=dt.date(),
-            open=float(row.get("Open") if "Open" in row else row.get("open", None)),
-            high=float(row.get("High") if "High" in row else row.get("high", None)),
-            low=float(row.get("Low") if "Low" in row else row.get("low", None)),
-            close=float(row.get("Close") if "Close" in row else row.get("close", None)),
-            adj_close=float(row.get("Adj Close") if "Adj Close" in row else row.get("adj_close", None)),
-            volume=int(row.get("Volume") if "Volume" in row else row.get("volume", 0)),
-        )
-        to_insert.append(ph)
-        inserted += 1
+    table = pa.concat_tables(
+        [tbl.append_column("symbol", pa.array([t] * tbl.num_rows, pa.string())) for t, tbl in cleaned],
+        promote_options="default",
+    )
+    ds.write_dataset(
+        table,
+        SILVER_DIR,
+        format="parquet",
+        partitioning=["symbol"],
+        partitioning_flavor="hive",
+        file_options=SILVER_FILE_OPTIONS,
+        basename_template="part-{i}.parquet" if replace else f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+        existing_data_behavior="delete_matching" if replace else "overwrite_or_ignore",
+    )
+    logger.debug("Wrote silver dataset partitions for %d tickers (%d rows)", len(cleaned), table.num_rows)
+
+
+def insert_into_db(session, company_id: int, table: pa.Table) -> int:
+    """
+    Inserts rows from table (columns: Date, Open, High, Low, Close, Adj Close, Volume; nulls for missing)
+    with one executemany INSERT IGNORE; rows already present are skipped. Returns number of inserted rows
+    """
+    if table.num_rows == 0:
+        return 0
+    table = table.rename_columns([PRICE_COLUMNS.get(c, c) for c in table.column_names])
+    # timestamps -> dates in one vectorized cast, so rows come out with datetime.date already
+    ti = table.schema.get_field_index("trade_date")
+    table = table.set_column(ti, "trade_date", table.column(ti).cast(pa.date32()))
+    records = [dict(row, company_id=company_id) for row in table.to_pylist()]
 
-    if to_insert:
-        session.add_all(to_insert)
-        session.commit()
-    return inserted
+    result = session.execute(INSERT_PRICES, records)
+    session.commit()
+    return result.rowcount
 
 
-def process_batch(session, tickers: List[str], mapping: dict):
-    results = download_yf(tickers, START_DATE, END_DATE)
-    total_inserted = 0
-    for t in tickers:
-        df = results.get(t, pd.DataFrame())
-        if df is None or df.empty:
-            logger.warning("No data for %s", t)
-            continue
+def standardize_download(df: pd.DataFrame) -> pd.DataFrame:
+    """Keep the known OHLCV columns of a yfinance frame under their standard names."""
+    # Standardize column names (yfinance can return different caps)
+    df = df.rename(columns=lambda c: c if isinstance(c, str) else str(c))
+    keep_cols = [c for c in ["Open", "High", "Low", "Close", "Adj Close", "Volume"] if c in df.columns]
+    return df[keep_cols].copy()
+
 
-        # Standardize column names (yfinance can return different caps)
-        df = df.rename(columns=lambda c: c if isinstance(c, str) else str(c))
-        # keep known columns
-        keep_cols = [c for c in ["Open", "High", "Low", "Close", "Adj Close", "Volume"] if c in df.columns]
-        df = df[keep_cols].copy()
+def after(df: pd.DataFrame, day: Optional[datetime.date]) -> pd.DataFrame:
+    """Rows of a date-indexed frame strictly after day (all rows if day is None)."""
+    return df if day is None else df[df.index > pd.Timestamp(day)]
 
-        # validate & clean
-        df_clean = validate_ohlcv(df)
+
+def process_batch(tickers: List[str], db_latest: dict) -> List[Tuple[str, pa.Table]]:
+    """
+    Download, validate and write bronze/silver parquet for a batch of tickers.
+    Touches no DB state (runs on worker threads); returns (ticker, cleaned table) pairs to insert.
+    Tickers with a bronze file only download the days after its last cached date; an empty tail
+    (weekend, holiday, market still open) just means bronze is current.
+    db_latest (ticker -> latest trade_date in price_history, from main) decides what gets inserted:
+    only rows newer than it. Bronze is written before the DB insert commits, so a ticker whose DB rows
+    lag its bronze file is re-inserted from bronze. Only the new rows (plus VALIDATION_LOOKBACK of
+    context for the forward-fill) are validated; silver gets the rows newer than the previous bronze.
+    """
+    cached = {t: latest_cached_date(BRONZE_DIR / f"{t}.parquet") for t in tickers}
+    full = [t for t in tickers if cached[t] is None or cached[t] < START_DATE]
+    tail = [t for t in tickers if t not in full and cached[t] < END_DATE]
+
+    results = {}
+    if full:
+        results.update(download_yf(full, START_DATE, END_DATE))
+    if tail:
+        tail_start = min(cached[t] for t in tail) + datetime.timedelta(days=1)
+        results.update(download_yf(tail, tail_start, END_DATE))
+
+    replaced, appended, to_insert = [], [], []
+    current = 0
+    for t in tickers:
+        bronze_path = BRONZE_DIR / f"{t}.parquet"
+        df = results.get(t)
+        downloaded = df is not None and not df.empty
+        db_from = db_latest.get(t)
+        if t in full:
+            if not downloaded:
+                logger.warning("No data for %s", t)
+                continue
+            df = standardize_download(df)
+            silver_from = None
+        elif downloaded:
+            df = merge_cached(bronze_path, standardize_download(df))
+            silver_from = cached[t]
+        elif db_from is not None and db_from >= cached[t]:
+            current += 1
+            continue
+        else:
+            # bronze is already current, only its DB insert is missing
+            logger.info("%s cached up to %s but DB only up to %s, re-inserting from bronze", t, cached[t], db_from)
+            df = pd.read_parquet(bronze_path, engine="pyarrow")
+            silver_from = cached[t]
+
+        if downloaded:
+            df_to_parquet(df, bronze_path)
+
+        # validate & clean only what is new to the DB or silver (plus forward-fill context)
+        since = None if silver_from is None or db_from is None else min(silver_from, db_from)
+        window = df if since is None else after(df, since - VALIDATION_LOOKBACK)
+        df_clean = validate_ohlcv(window)
         if df_clean.empty:
             logger.warning("After validation data empty for %s", t)
             continue
 
-        # Write bronze
-        bronze_path = BRONZE_DIR / f"{t}.parquet"
-        df_to_parquet(df, bronze_path)
+        new_db = after(df_clean, db_from)
+        if not new_db.empty:
+            to_insert.append((t, pa.Table.from_pandas(new_db.rename_axis("Date"), preserve_index=True)))
+        new_silver = after(df_clean, silver_from)
+        if not new_silver.empty:
+            target = replaced if silver_from is None else appended
+            target.append((t, pa.Table.from_pandas(new_silver.rename_axis("Date"), preserve_index=True)))
+
+    if current:
+        logger.info("%d tickers already current in bronze and DB, skipped", current)
+
+    # Write silver (cleaned): one dataset write per mode for the whole batch
+    if replaced:
+        write_silver(replaced, replace=True)
+    if appended:
+        write_silver(appended, replace=False)
+
+    return to_insert
 
-        # Write silver (cleaned)
-        silver_path = SILVER_DIR / f"{t}.parquet"
-        df_to_parquet(df_clean, silver_path)
 
-        # Insert into DB using mapping
+def insert_batch(session, cleaned: List[Tuple[str, pa.Table]], mapping: dict) -> int:
+    """Insert the (ticker, table) pairs from process_batch using mapping; returns inserted rows."""
+    total_inserted = 0
+    for t, table in cleaned:
         company_id = mapping.get(t)
         if not company_id:
             logger.error("No company id for %s", t)
             continue
 
         try:
-            inserted = insert_into_db(session, company_id, df_clean)
+            inserted = insert_into_db(session, company_id, table)
             logger.info("Inserted %d rows for %s into DB", inserted, t)
             total_inserted += inserted
         except SQLAlchemyError as e:
@@ -166,11 +316,6 @@ def process_batch(session, tickers: List[str], mapping: dict):
     return total_inserted
 
 
-def chunk_list(lst, n):
-    for i in range(0, len(lst), n):
-        yield lst[i : i + n]
-
-
 def main():
     started_at = datetime.datetime.utcnow()
     session = get_session()
@@ -183,14 +328,22 @@ def main():
         symbols_payload = [{"symbol": t, "exchange": "NSE"} for t in tickers]
         mapping = ensure_companies(session, symbols_payload)
         logger.info("Company mapping created for %d companies", len(mapping))
+        latest = get_latest_dates_bulk(session, list(mapping.values()))
+        db_latest = {t: latest.get(cid) for t, cid in mapping.items()}
 
+        # downloads run on the pool; all DB inserts stay on this thread (the session is not thread-safe)
         total_rows = 0
-        for batch in chunk_list(tickers, BATCH_SIZE):
-            logger.info("Processing batch of %d tickers", len(batch))
-            inserted = process_batch(session, batch, mapping)
-            total_rows += inserted
-            # polite pause
-            time.sleep(2)
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+            futures = {pool.submit(process_batch, batch, db_latest): batch for batch in chunk_list(tickers, BATCH_SIZE)}
+            for fut in as_completed(futures):
+                batch = futures[fut]
+                try:
+                    cleaned = fut.result()
+                except Exception as e:
+                    logger.exception("Batch download failed (%s): %s", ", ".join(batch), e)
+                    continue
+                logger.info("Processing batch of %d tickers", len(batch))
+                total_rows += insert_batch(session, cleaned, mapping)
 
         log_etl_run(session, pipeline_name="fetch_price_history", status="SUCCESS", rows_processed=total_rows, started_at=started_at, ended_at=datetime.datetime.utcnow())
         logger.info("ETL finished. Total rows inserted: %d", total_rows)
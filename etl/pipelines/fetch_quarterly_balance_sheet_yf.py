@@ -15,16 +15,15 @@ Notes:
 """
 
 import sys
-import time
 import logging
 import datetime
-from decimal import Decimal, InvalidOperation
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import Dict, Any, Optional, List
 
 import pandas as pd
 import yfinance as yf
-from sqlalchemy import text
+from sqlalchemy import insert, text
 
 # Ensure project root is on path when executed directly
 ROOT = Path(__file__).resolve().parents[2]
@@ -32,6 +31,9 @@ if str(ROOT) not in sys.path:
     sys.path.append(str(ROOT))
 
 from etl.utils.db import get_session
+from etl.utils.ratelimit import RateLimiter
+from etl.utils.http import YF_SESSION
+from database.Models import FinancialsBalanceSheet
 
 LOG = logging.getLogger("etl.qbs_yf")
 LOG.setLevel(logging.INFO)
@@ -73,39 +75,16 @@ SELECT_COMPANIES_SQL = """
     WHERE symbol IS NOT NULL AND symbol != ''
 """
 
-INSERT_SQL = """
-INSERT INTO financials_balance_sheet
-  (company_id, fiscal_year, fiscal_quarter, report_date,
-   total_assets, total_liabilities, shareholder_equity,
-   current_assets, current_liabilities, cash_and_equivalents,
-   inventory, receivables, long_term_debt, short_term_debt,
-   retained_earnings, created_at)
-VALUES
-  (:company_id, :fiscal_year, :fiscal_quarter, :report_date,
-   :total_assets, :total_liabilities, :shareholder_equity,
-   :current_assets, :current_liabilities, :cash_and_equivalents,
-   :inventory, :receivables, :long_term_debt, :short_term_debt,
-   :retained_earnings, NOW())
-"""
+# Core INSERT IGNORE, built once (compiled form reused via the statement cache): rows already present
+# (uq_bs_company_report) are skipped by MySQL, no per-row existence check
+INSERT_STMT = insert(FinancialsBalanceSheet.__table__).prefix_with("IGNORE")
 
-CHECK_EXIST_SQL = """
-SELECT id FROM financials_balance_sheet
-WHERE company_id = :company_id AND report_date = :report_date
-LIMIT 1
-"""
+# Yahoo fetches run concurrently (network-bound); the token bucket keeps them at ~5 requests/sec
+MAX_WORKERS = 8
+YF_LIMITER = RateLimiter(rate=5, per=1.0)
 
-def to_decimal_safe(val) -> Optional[Decimal]:
-    """Convert numeric from yfinance (int/float/np) to Decimal or None."""
-    if val is None or (isinstance(val, float) and (pd.isna(val))):
-        return None
-    try:
-        # yfinance values are usually integers (raw amount)
-        return Decimal(str(int(val)))
-    except (InvalidOperation, ValueError, TypeError):
-        try:
-            return Decimal(str(val))
-        except Exception:
-            return None
+# Balance sheet rows are buffered and inserted + committed once per this many companies
+COMMIT_EVERY = 50
 
 def quarter_from_date(dt: datetime.date) -> int:
     m = dt.month
@@ -131,16 +110,14 @@ def load_companies_from_csv(csv_path: Path) -> List[tuple]:
             continue
     return out
 
-def normalize_symbol_for_yf(sym: str) -> str:
+def normalize_symbols_for_yf(symbols: List[str]) -> List[str]:
     """
-    Normalize symbol to Yahoo Finance style. For NSE tickers your repo probably uses 'RELIANCE.NS'.
+    Normalize symbols to Yahoo Finance style in one vectorized pass. For NSE tickers your repo probably uses 'RELIANCE.NS'.
     yfinance understands 'RELIANCE.NS' — keep as-is. If your symbol lacks exchange, optionally add '.NS'
     """
-    s = sym.strip().upper()
-    if "." not in s:
-        # assume NSE if no suffix (be cautious)
-        s = s + ".NS"
-    return s
+    syms = pd.Series(symbols, dtype=object).astype(str).str.strip().str.upper()
+    # assume NSE if no suffix (be cautious)
+    return syms.where(syms.str.contains(".", regex=False), syms + ".NS").tolist()
 
 def extract_balance_rows(bal_df: pd.DataFrame) -> Dict[str, Any]:
     """
@@ -153,11 +130,34 @@ def extract_balance_rows(bal_df: pd.DataFrame) -> Dict[str, Any]:
     if bal_df is None or bal_df.shape[0] == 0:
         return out
 
-    # ensure index strings
-    bal_df.index = [str(i).strip() for i in bal_df.index]
+    # ensure index strings; match labels once per frame, not per column
+    labels = [str(i).strip().lower() for i in bal_df.index]
+    idx_lower = {}
+    for ri, label in enumerate(labels):
+        idx_lower.setdefault(label, ri)
+
+    # (row position, db column) per matched YF label: exact (case-insensitive) match wins, else first row containing it
+    pairs = []
+    for yf_label, db_col in YF_TO_DB.items():
+        key = yf_label.lower()
+        ri = idx_lower.get(key)
+        if ri is None:
+            ri = next((i for i, label in enumerate(labels) if key in label), None)
+        if ri is not None:
+            pairs.append((ri, db_col))
+
+    db_cols = list(dict.fromkeys(YF_TO_DB.values()))
+    # mapped rows only, converted once: yfinance raw amounts -> nullable Int64 -> Python int / None
+    mapped = bal_df.iloc[[ri for ri, _ in pairs]].apply(pd.to_numeric, errors="coerce")
+    mapped = mapped.astype("Float64").round().astype("Int64")
+    # one row per reporting date, values in pairs order
+    mapped = mapped.T.astype(object)
+    mapped = mapped.where(mapped.notna(), None)
+    pair_cols = [db_col for _, db_col in pairs]
+    rows = mapped.itertuples(index=False, name=None) if pairs else [()] * len(bal_df.columns)
 
     # iterate columns (each column is a reporting date)
-    for col in bal_df.columns:
+    for col, values in zip(bal_df.columns, rows):
         try:
             # yfinance column is a Timestamp
             if isinstance(col, (pd.Timestamp, datetime.datetime)):
@@ -168,46 +168,28 @@ def extract_balance_rows(bal_df: pd.DataFrame) -> Dict[str, Any]:
         except Exception:
             continue
 
-        rowvals = {}
-        for yf_label, db_col in YF_TO_DB.items():
-            # find best matching index row (case-insensitive substring)
-            matched = None
-            for idx_label in bal_df.index:
-                if yf_label.lower() == idx_label.lower():
-                    matched = idx_label
-                    break
-            if matched is None:
-                # try fuzzy contains
-                for idx_label in bal_df.index:
-                    if yf_label.lower() in idx_label.lower():
-                        matched = idx_label
-                        break
-
-            if matched:
-                raw = bal_df.at[matched, col]
-                rowvals[db_col] = to_decimal_safe(raw)
-            else:
-                # leave missing as None
-                rowvals[db_col] = None
+        # leave unmatched columns as None
+        rowvals = dict.fromkeys(db_cols)
+        rowvals.update(zip(pair_cols, values))
 
         out[dt] = rowvals
     return out
 
-def insert_balance_for_company(session_db, company_id: int, report_date: datetime.date, vals: dict):
-    # Skip if already exists
-    exists = session_db.execute(text(CHECK_EXIST_SQL), {"company_id": company_id, "report_date": report_date.isoformat()}).fetchone()
-    if exists:
-        LOG.info("Row exists for company=%s date=%s — skipping", company_id, report_date.isoformat())
-        return False
-
-    fiscal_year = report_date.year
-    fiscal_quarter = quarter_from_date(report_date)
+def fetch_balance_rows(yf_sym: str) -> Optional[Dict[str, Any]]:
+    """Fetch and map one ticker's quarterly balance sheet (runs on worker threads, no DB); None if Yahoo has none."""
+    YF_LIMITER.acquire()
+    bal = yf.Ticker(yf_sym, session=YF_SESSION).quarterly_balance_sheet
+    if bal is None or bal.empty:
+        return None
+    return extract_balance_rows(bal)
 
-    params = {
+def balance_params(company_id: int, report_date: datetime.date, vals: dict) -> dict:
+    """Bind parameters for one INSERT_STMT row."""
+    return {
         "company_id": company_id,
-        "fiscal_year": fiscal_year,
-        "fiscal_quarter": fiscal_quarter,
-        "report_date": report_date.isoformat(),
+        "fiscal_year": report_date.year,
+        "fiscal_quarter": quarter_from_date(report_date),
+        "report_date": report_date,
         "total_assets": vals.get("total_assets"),
         "total_liabilities": vals.get("total_liabilities"),
         "shareholder_equity": vals.get("shareholder_equity"),
@@ -221,15 +203,39 @@ def insert_balance_for_company(session_db, company_id: int, report_date: datetim
         "retained_earnings": vals.get("retained_earnings"),
     }
 
-    # Convert Decimal -> numeric (string) for SQL param handling
-    for k, v in list(params.items()):
-        if isinstance(v, Decimal):
-            params[k] = str(int(v))  # store integer string (DB DECIMAL will accept)
-        elif v is None:
-            params[k] = None
+def insert_balance_rows(session_db, batch: List[tuple]) -> int:
+    """
+    Insert buffered rows for a batch of companies [(company_id, [balance_params, ...]), ...] and commit once.
+    Fast path is a single executemany; if it fails, each company is retried in its own savepoint so one
+    broken company rolls back only its rows. Returns rows actually inserted.
+    """
+    rows = [r for _, company_rows in batch for r in company_rows]
+    if not rows:
+        return 0
+    try:
+        result = session_db.execute(INSERT_STMT, rows)
+        session_db.commit()
+        return result.rowcount
+    except Exception as e:
+        LOG.warning("Bulk insert of %d balance sheet rows failed (%s); retrying per company", len(rows), e)
+        session_db.rollback()
 
-    session_db.execute(text(INSERT_SQL), params)
-    return True
+    inserted = 0
+    for cid, company_rows in batch:
+        if not company_rows:
+            continue
+        try:
+            with session_db.begin_nested():
+                inserted += session_db.execute(INSERT_STMT, company_rows).rowcount
+        except Exception as e:
+            LOG.exception("Insert failed for company_id=%s: %s", cid, e)
+    try:
+        session_db.commit()
+    except Exception as e:
+        LOG.exception("Commit failed after per-company retry: %s", e)
+        session_db.rollback()
+        return 0
+    return inserted
 
 def run():
     session_db = get_session()
@@ -243,54 +249,45 @@ def run():
 
     LOG.info("Found %d companies to process", len(companies))
     report = []
+    pending = []
+    inserted_total = 0
+
+    companies = [(cid, sym) for cid, sym in companies if sym]
+    yf_syms = normalize_symbols_for_yf([sym for _, sym in companies])
+
+    # fetches run on the pool; DB writes stay on this thread (the session is not thread-safe)
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        futures = {
+            pool.submit(fetch_balance_rows, yf_sym): (cid, sym, yf_sym)
+            for (cid, sym), yf_sym in zip(companies, yf_syms)
+        }
+        for fut in as_completed(futures):
+            cid, sym, yf_sym = futures[fut]
+            LOG.info("Processing company_id=%s symbol=%s (yf=%s)", cid, sym, yf_sym)
 
-    for cid, sym in companies:
-        if not sym:
-            continue
-        yf_sym = normalize_symbol_for_yf(sym)
-        LOG.info("Processing company_id=%s symbol=%s (yf=%s)", cid, sym, yf_sym)
-
-        try:
-            tk = yf.Ticker(yf_sym)
-            bal = tk.quarterly_balance_sheet
-            if bal is None or bal.empty:
-                LOG.warning("No quarterly balance sheet for %s", yf_sym)
-                report.append({"company_id": cid, "symbol": sym, "status": "NO_DATA"})
-                time.sleep(0.5)
-                continue
-
-            # extract dictionary: date -> mapped values
-            mapping = extract_balance_rows(bal)
-            inserted_count = 0
-            for report_dt, vals in mapping.items():
-                try:
-                    ok = insert_balance_for_company(session_db, cid, report_dt, vals)
-                    if ok:
-                        inserted_count += 1
-                except Exception as e:
-                    LOG.exception("Insert failed for %s %s: %s", cid, report_dt, e)
-            # commit per company to reduce transaction size
             try:
-                session_db.commit()
+                # dictionary: date -> mapped values
+                mapping = fut.result()
+                if mapping is None:
+                    LOG.warning("No quarterly balance sheet for %s", yf_sym)
+                    report.append({"company_id": cid, "symbol": sym, "status": "NO_DATA"})
+                    continue
+
+                pending.append((cid, [balance_params(cid, report_dt, vals) for report_dt, vals in mapping.items()]))
+                if len(pending) >= COMMIT_EVERY:
+                    inserted_total += insert_balance_rows(session_db, pending)
+                    pending = []
+
+                LOG.info("Extracted %d quarters for %s", len(mapping), yf_sym)
+                report.append({"company_id": cid, "symbol": sym, "quarters": len(mapping), "status": "OK"})
             except Exception as e:
-                LOG.exception("Commit failed after inserts for %s: %s", cid, e)
-                session_db.rollback()
-
-            LOG.info("Inserted %d rows for %s", inserted_count, yf_sym)
-            report.append({"company_id": cid, "symbol": sym, "inserted": inserted_count, "status": "OK"})
-        except Exception as e:
-            LOG.exception("Failed processing %s: %s", yf_sym, e)
-            report.append({"company_id": cid, "symbol": sym, "status": f"ERROR: {e}"})
-
-        # gentle pause to avoid throttling
-        time.sleep(0.8)
+                LOG.exception("Failed processing %s: %s", yf_sym, e)
+                report.append({"company_id": cid, "symbol": sym, "status": f"ERROR: {e}"})
 
-    # final commit & close
-    try:
-        session_db.commit()
-    except Exception:
-        session_db.rollback()
+    # final flush & close
+    inserted_total += insert_balance_rows(session_db, pending)
     session_db.close()
+    LOG.info("Inserted %d new balance sheet rows", inserted_total)
 
     # Save report CSV in data/etl_reports
     try:
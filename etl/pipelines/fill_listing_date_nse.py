@@ -6,11 +6,12 @@ Run:
 """
 
 import sys
-import time
 import logging
 import datetime
 import requests
+from io import BytesIO
 import pandas as pd
+import pyarrow.csv as pacsv
 from pathlib import Path
 from sqlalchemy import text
 
@@ -19,7 +20,7 @@ ROOT = Path(__file__).resolve().parents[2]
 if str(ROOT) not in sys.path:
     sys.path.append(str(ROOT))
 
-from etl.utils.db import get_session
+from etl.utils.db import get_session, bulk_connection, bulk_update_by_id
 
 
 # ------------------------------------------------------------------------------
@@ -56,8 +57,8 @@ def download_equity_l():
     r = requests.get(EQUITY_L_URL, headers=HEADERS, timeout=20)
     r.raise_for_status()
 
-    from io import StringIO
-    df = pd.read_csv(StringIO(r.text))
+    # multithreaded C++ parse straight from the response bytes (raw headers carry spaces, normalized in run_fill)
+    df = pacsv.read_csv(BytesIO(r.content)).to_pandas()
 
     LOG.info("Downloaded EQUITY_L.csv with %d rows", len(df))
     return df
@@ -75,21 +76,15 @@ def normalize_symbol(sym: str) -> str:
 # DB helpers
 # ------------------------------------------------------------------------------
 
-def get_all_companies(session_db):
-    q = text("""
+def get_all_companies(session_db, missing_only: bool = False):
+    """Rows of (id, symbol, listing_date); missing_only filters server-side to companies without a listing date."""
+    sql = """
         SELECT id, symbol, listing_date
         FROM companies
-    """)
-    return session_db.execute(q).fetchall()
-
-
-def update_listing_date(session_db, cid, listing_date):
-    q = text("""
-        UPDATE companies
-        SET listing_date = :ld
-        WHERE id = :cid
-    """)
-    session_db.execute(q, {"ld": listing_date, "cid": cid})
+    """
+    if missing_only:
+        sql += " WHERE listing_date IS NULL"
+    return session_db.execute(text(sql)).fetchall()
 
 
 # ------------------------------------------------------------------------------
@@ -100,9 +95,9 @@ def run_fill():
 
     session_db = get_session()
 
-    # STEP 1 — load all companies
-    companies = get_all_companies(session_db)
-    LOG.info("Loaded %d companies from DB", len(companies))
+    # STEP 1 — load companies still missing a listing date
+    companies = get_all_companies(session_db, missing_only=True)
+    LOG.info("Loaded %d companies without listing date from DB", len(companies))
 
     # STEP 2 — download NSE listing data
     df = download_equity_l()
@@ -113,34 +108,23 @@ def run_fill():
     if "SYMBOL" not in df.columns or "DATE OF LISTING" not in df.columns:
         raise RuntimeError("EQUITY_L.csv format changed!")
 
-    # Prepare mapping: symbol → date
-    nse_map = {}
-
-    for _, row in df.iterrows():
-        sym = str(row["SYMBOL"]).strip().upper()
-        ld_raw = str(row["DATE OF LISTING"]).strip()
-
-        try:
-            ld = datetime.datetime.strptime(ld_raw, "%d-%b-%Y").date()
-            nse_map[sym] = ld.isoformat()
-        except:
-            continue
+    # Prepare mapping: symbol → date (vectorized parse; unparseable dates dropped)
+    listed = pd.to_datetime(df["DATE OF LISTING"].astype(str).str.strip(), format="%d-%b-%Y", errors="coerce")
+    ok = listed.notna()
+    nse_map = dict(zip(df.loc[ok, "SYMBOL"].astype(str).str.strip().str.upper(), listed[ok].dt.strftime("%Y-%m-%d")))
 
     LOG.info("Prepared %d listing-date mappings", len(nse_map))
 
     # Process each company
     report = []
+    updates = []
 
     for cid, sym, ld in companies:
         sym_clean = normalize_symbol(sym)
 
-        if ld not in (None, "", "0000-00-00"):
-            # listing date already present
-            continue
-
         if sym_clean in nse_map:
             new_date = nse_map[sym_clean]
-            update_listing_date(session_db, cid, new_date)
+            updates.append((cid, new_date))
 
             LOG.info("Updated %s → %s", sym_clean, new_date)
 
@@ -159,14 +143,10 @@ def run_fill():
                 "status": "NOT_FOUND"
             })
 
-        time.sleep(0.1)
-
-    # Commit final changes
-    try:
-        session_db.commit()
-    except:
-        session_db.rollback()
-        raise
+    # Write all listing dates in bulk, in one transaction (commits on success, rolls back on error)
+    session_db.close()
+    with bulk_connection() as conn:
+        bulk_update_by_id(conn, "companies", "listing_date", updates)
 
     # Save report
     ts = datetime.datetime.utcnow().strftime("%Y%m%d_%H%M%S")
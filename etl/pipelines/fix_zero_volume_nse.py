@@ -6,7 +6,6 @@ Usage:
 """
 
 import os
-import io
 import sys
 import time
 import zipfile
@@ -14,9 +13,13 @@ import logging
 import datetime
 import requests
 import pandas as pd
+import pyarrow.csv as pacsv
 from pathlib import Path
+from itertools import groupby
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from sqlalchemy import text
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception
 
 # Ensure project root
 if __name__ == "__main__":
@@ -26,6 +29,8 @@ if __name__ == "__main__":
 
 # Imports
 from etl.utils.db import get_session
+from etl.utils.ratelimit import RateLimiter
+from etl.utils.nse import nse_session, nse_get, save_cookies
 from database.Models import Company, PriceHistory
 
 # Logging
@@ -48,12 +53,44 @@ HEADERS = {
     "Referer": "https://www.nseindia.com"
 }
 REQUEST_TIMEOUT = 20
-REQUEST_PAUSE = 0.8
+DOWNLOAD_CHUNK = 1 << 20
+
+# Downloaded bhavcopies (raw zip + parsed (symbol, vol) parquet) and known-missing dates (.holiday sentinel)
+BHAV_CACHE_DIR = Path("data/cache/bhav")
+BHAV_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+# A 404 is only cached as a holiday for weekends or settled dates: recent bhavcopies may simply not be
+# published yet. Weekday sentinels expire, so misses caused by archive URL changes get re-checked.
+HOLIDAY_SETTLE_DAYS = 7
+HOLIDAY_TTL = 30 * 24 * 3600  # seconds
+
+# bhavcopies are downloaded + parsed concurrently (network-bound); the token bucket keeps NSE archives polite
+MAX_WORKERS = 8
+NSE_LIMITER = RateLimiter(rate=4, per=1.0)
+
+class HolidayError(Exception):
+    """No bhavcopy for the date (archive answered 404, i.e. non-trading day); never retried."""
+
+
+def is_transient(exc: BaseException) -> bool:
+    """
+    Connection resets, timeouts, 5xx and 403 are worth retrying; anything else will fail the same way again.
+    403 is NSE bot-blocking / stale cookies (also on trading days), never proof of a holiday: each retry
+    goes through nse_get, which re-primes the cookies.
+    """
+    if isinstance(exc, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    return (
+        isinstance(exc, requests.exceptions.HTTPError)
+        and exc.response is not None
+        and (exc.response.status_code == 403 or exc.response.status_code >= 500)
+    )
+
 
 retry_network = retry(
     stop=stop_after_attempt(5),
     wait=wait_exponential(min=1, max=10),
-    retry=retry_if_exception_type((requests.exceptions.RequestException,))
+    retry=retry_if_exception(is_transient),
+    reraise=True,
 )
 
 
@@ -72,15 +109,25 @@ def nse_bhav_url_for_date(dt: datetime.date):
 # ---------------------------- Downloader ----------------------------
 
 @retry_network
-def download_bhavzip(session: requests.Session, url: str) -> bytes:
+def download_bhavzip(session: requests.Session, url: str, dest: Path) -> Path:
+    """Stream the zip to dest in DOWNLOAD_CHUNK pieces (never held whole in memory); returns dest."""
     LOG.info("Downloading %s", url)
-    r = session.get(url, headers=HEADERS, timeout=REQUEST_TIMEOUT, stream=True)
-    r.raise_for_status()
-    return r.content
-
-
-def parse_bhav_csv_from_zipbytes(zip_bytes: bytes, inner_csv_name: str) -> pd.DataFrame:
-    with zipfile.ZipFile(io.BytesIO(zip_bytes)) as z:
+    NSE_LIMITER.acquire()
+    tmp = dest.with_suffix(".part")
+    with nse_get(session, url, HEADERS, timeout=REQUEST_TIMEOUT, stream=True) as r:
+        if r.status_code == 404:
+            raise HolidayError(f"No bhavcopy at {url} (HTTP {r.status_code})")
+        r.raise_for_status()
+        with open(tmp, "wb") as f:
+            for block in r.iter_content(chunk_size=DOWNLOAD_CHUNK):
+                f.write(block)
+    # rename only once complete, so an interrupted download never looks like a cached zip
+    tmp.replace(dest)
+    return dest
+
+
+def parse_bhav_csv_from_zip(zip_path: Path, inner_csv_name: str) -> pd.DataFrame:
+    with zipfile.ZipFile(zip_path) as z:
         names = z.namelist()
         target = None
         for n in names:
@@ -95,12 +142,13 @@ def parse_bhav_csv_from_zipbytes(zip_bytes: bytes, inner_csv_name: str) -> pd.Da
         if not target:
             raise RuntimeError("No CSV inside ZIP")
         LOG.info("Reading CSV: %s", target)
+        # Arrow's C++ parser reads the member as it inflates; build_symbol_volume_frame normalizes types
         with z.open(target) as f:
-            df = pd.read_csv(f, dtype=str)
-    return df
+            return pacsv.read_csv(f).to_pandas()
 
 
-def build_symbol_volume_map(df: pd.DataFrame) -> dict:
+def build_symbol_volume_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Normalize a bhavcopy to one row per symbol: columns symbol (upper-case), vol (int64)."""
     # Locate symbol column
     sym_col = None
     for c in df.columns:
@@ -127,127 +175,202 @@ def build_symbol_volume_map(df: pd.DataFrame) -> dict:
     if not vol_col:
         raise RuntimeError("No volume column found")
 
-    mapping = {}
-    for _, row in df.iterrows():
-        sym = str(row[sym_col]).strip().upper()
-        raw = row.get(vol_col, "")
+    # vectorized: unparseable volumes -> 0; duplicate symbols -> last row wins
+    syms = df[sym_col].astype(str).str.strip().str.upper()
+    vols = pd.to_numeric(df[vol_col].astype(str).str.replace(",", "", regex=False).str.strip(), errors="coerce")
+    vols = vols.fillna(0).astype("int64")
+    out = pd.DataFrame({"symbol": syms, "vol": vols})
+    return out.drop_duplicates("symbol", keep="last").reset_index(drop=True)
+
+
+def parse_bhav_frame(zip_path: Path, inner_csv_name: str) -> pd.DataFrame:
+    """Cached zip -> compact (symbol, vol) frame."""
+    return build_symbol_volume_frame(parse_bhav_csv_from_zip(zip_path, inner_csv_name))
+
+
+def fetch_bhav_frame(session_web: requests.Session, dt: datetime.date) -> pd.DataFrame:
+    """
+    Download and parse one date's bhavcopy into (symbol, vol) rows (runs on worker threads, no DB).
+    Cached under BHAV_CACHE_DIR: reruns read the parsed parquet, and known holidays are not re-requested.
+    """
+    frame_path = BHAV_CACHE_DIR / f"{dt.isoformat()}.parquet"
+    zip_path = frame_path.with_suffix(".zip")
+    holiday_path = frame_path.with_suffix(".holiday")
+    if frame_path.exists():
+        return pd.read_parquet(frame_path)
+
+    url, inner = nse_bhav_url_for_date(dt)
+    if holiday_cached(holiday_path, dt):
+        raise HolidayError(f"No bhavcopy for {dt} (cached miss)")
+    if not zip_path.exists():
         try:
-            vol = int(float(str(raw).replace(",", "").strip()))
-        except:
-            vol = 0
-        mapping[sym] = vol
-    return mapping
-
+            download_bhavzip(session_web, url, zip_path)
+        except HolidayError:
+            if dt.weekday() >= 5 or (datetime.date.today() - dt).days > HOLIDAY_SETTLE_DAYS:
+                holiday_path.touch()
+            raise
 
-# ---------------------------- DB Helpers ----------------------------
+    frame = parse_bhav_frame(zip_path, inner)
+    # same as the zip download: write aside, rename once complete, so a partial file is never read as cache
+    tmp = frame_path.with_suffix(".parquet.part")
+    frame.to_parquet(tmp, index=False)
+    tmp.replace(frame_path)
+    return frame
 
-def get_zero_volume_dates(session_db):
-    """Return list of trade_date values where volume=0 exists."""
-    q = text("""
-        SELECT DISTINCT trade_date
-        FROM price_history
-        WHERE volume = 0
-        ORDER BY trade_date;
-    """)
-    rows = session_db.execute(q).fetchall()
-
-    out = []
-    for r in rows:
-        d = r[0]
-        if isinstance(d, datetime.date):
-            out.append(d)
-        else:
-            out.append(datetime.datetime.fromisoformat(str(d)).date())
-    return out
 
+def holiday_cached(path: Path, dt: datetime.date) -> bool:
+    """Whether a .holiday sentinel is still trusted: weekends forever, weekdays for HOLIDAY_TTL."""
+    try:
+        age = time.time() - path.stat().st_mtime
+    except OSError:
+        return False
+    return dt.weekday() >= 5 or age < HOLIDAY_TTL
 
-def get_company_symbol_map(session_db):
-    q = text("SELECT id, symbol FROM companies;")
-    rows = session_db.execute(q).fetchall()
-
-    id_by_sym = {}
-    sym_by_id = {}
-    for r in rows:
-        cid, sym = r
-        if not sym:
-            continue
-        s = sym.strip().upper()
-        base = s.split(".")[0]
-        id_by_sym[base] = cid
-        sym_by_id[cid] = s
-    return id_by_sym, sym_by_id
 
+def known_holidays() -> set:
+    """Dates with a still-trusted .holiday sentinel in BHAV_CACHE_DIR (no bhavcopy exists for them)."""
+    dates = ((p, datetime.date.fromisoformat(p.stem)) for p in BHAV_CACHE_DIR.glob("*.holiday"))
+    return {dt for p, dt in dates if holiday_cached(p, dt)}
 
-def update_volumes_for_date(session_db, dt: datetime.date, bhav_map: dict):
-    """Fix all price_history rows for one trade_date."""
 
-    q = text("""
-        SELECT ph.id, ph.company_id, c.symbol
-        FROM price_history ph
-        JOIN companies c ON ph.company_id = c.id
-        WHERE ph.trade_date = :d AND ph.volume = 0;
-    """)
+# ---------------------------- DB Helpers ----------------------------
 
-    rows = session_db.execute(q, {"d": dt.isoformat()}).fetchall()
+ZERO_ROWS = text("""
+    SELECT ph.trade_date, ph.id, ph.company_id, c.symbol, c.base_symbol AS base
+    FROM price_history ph
+    JOIN companies c ON ph.company_id = c.id
+    WHERE ph.volume = 0
+    ORDER BY ph.trade_date
+""")
+ZERO_ROW_COLUMNS = ["id", "company_id", "symbol", "base"]
+
+
+def get_zero_volume_rows(session_db) -> dict:
+    """
+    trade_date -> DataFrame(id, company_id, symbol, base) of its zero-volume rows, in date order.
+    A single query for the whole run instead of one per date (idx_price_volume_date serves the filter
+    and the ordering). All zero-volume rows are held in memory, as run_fix needs every date up front to
+    queue the downloads; yield_per only avoids a second, fetchall-sized copy of the raw rows.
+    """
+    rows = session_db.execute(ZERO_ROWS.execution_options(yield_per=10000))
+    return {
+        dt: pd.DataFrame([r[1:] for r in grp], columns=ZERO_ROW_COLUMNS)
+        for dt, grp in groupby(rows, key=itemgetter(0))
+    }
 
-    updated_rows = []
-    for ph_id, cid, sym in rows:
-        base = sym.split(".")[0].upper()
-        vol = bhav_map.get(base)
 
-        if vol is None:
-            vol = bhav_map.get(sym.upper().replace(".NS", ""))
+def get_company_symbol_map(session_db):
+    df = pd.read_sql(text("SELECT id, symbol, base_symbol FROM companies"), session_db.connection())
+    df = df.dropna(subset=["symbol"])
+    df = df[df["base_symbol"] != ""]
 
-        if vol is None:
-            continue
+    id_by_sym = dict(zip(df["base_symbol"], df["id"].tolist()))
+    sym_by_id = dict(zip(df["id"].tolist(), df["symbol"].str.strip().str.upper()))
+    return id_by_sym, sym_by_id
 
-        upd = text("UPDATE price_history SET volume = :v WHERE id = :id")
-        session_db.execute(upd, {"v": int(vol), "id": ph_id})
 
-        updated_rows.append({
+# Per-date bhavcopy volumes are staged in a connection-local temp table and applied with one UPDATE ... JOIN.
+# Companies match on their stored base_symbol column (e.g. RELIANCE.NS -> RELIANCE).
+STAGE_DDL = text("""
+    CREATE TEMPORARY TABLE IF NOT EXISTS bhav_stage (
+        symbol VARCHAR(64) NOT NULL PRIMARY KEY,
+        vol BIGINT NOT NULL
+    )
+""")
+# DBAPI-level (pymysql paramstyle): pymysql folds executemany into one multi-row INSERT per packet
+STAGE_INSERT = "INSERT INTO bhav_stage (symbol, vol) VALUES (%s, %s)"
+STAGE_JOIN = """
+    price_history ph
+    JOIN companies c ON ph.company_id = c.id
+    JOIN bhav_stage s ON s.symbol = c.base_symbol
+"""
+STAGE_WHERE = "ph.trade_date = :d AND ph.volume = 0"
+
+
+def update_volumes_for_date(session_db, dt: datetime.date, rows: pd.DataFrame, bhav: pd.DataFrame):
+    """
+    Fix one trade_date's zero-volume rows (from get_zero_volume_rows) with the (symbol, vol) bhav frame.
+    The rows are merged with the bhav frame on companies.base_symbol in pandas, so only matched symbols
+    are staged and the report comes from the merge; then one UPDATE ... JOIN. Expects bhav_stage to exist
+    (created once per run by run_fix). Committed by the caller.
+    """
+    if rows.empty or bhav.empty:
+        return []
+    matched = rows.merge(bhav.rename(columns={"symbol": "base"}), on="base", how="inner")
+    if matched.empty:
+        return []
+
+    session_db.execute(text("DELETE FROM bhav_stage"))
+    staged = matched[["base", "vol"]].drop_duplicates("base")
+    # raw cursor on the session's connection (same transaction/savepoint): plain tuples, no per-row
+    # bind-parameter dicts or SQL compilation
+    cur = session_db.connection().connection.cursor()
+    try:
+        cur.executemany(STAGE_INSERT, list(zip(staged["base"], staged["vol"].tolist())))
+    finally:
+        cur.close()
+    session_db.execute(text(f"UPDATE {STAGE_JOIN} SET ph.volume = s.vol WHERE {STAGE_WHERE}"), {"d": dt.isoformat()})
+
+    return [
+        {
             "price_history_id": ph_id,
             "company_id": cid,
             "symbol": sym,
             "trade_date": dt.isoformat(),
             "new_volume": int(vol)
-        })
-
-    session_db.commit()
-    return updated_rows
+        }
+        for ph_id, cid, sym, vol in matched[["id", "company_id", "symbol", "vol"]].itertuples(index=False)
+    ]
 
 
 # ---------------------------- Main ----------------------------
 
 def run_fix():
-    session_web = requests.Session()
-    session_web.get("https://www.nseindia.com", headers=HEADERS)
+    # cached NSE cookies when fresh; downloads re-prime from the homepage only on 401/403
+    session_web = nse_session()
 
     session_db = get_session()
 
     id_by_sym, sym_by_id = get_company_symbol_map(session_db)
     LOG.info("Loaded %d companies from DB", len(id_by_sym))
 
-    zero_dates = get_zero_volume_dates(session_db)
-    LOG.info("Found %d trade_dates with zero-volume rows", len(zero_dates))
+    zero_rows = get_zero_volume_rows(session_db)
+    LOG.info("Found %d trade_dates with zero-volume rows", len(zero_rows))
+    holidays = known_holidays()
+    zero_dates = [d for d in zero_rows if d not in holidays]
+    if len(zero_dates) < len(zero_rows):
+        LOG.info("Skipping %d known holidays", len(zero_rows) - len(zero_dates))
 
-    report = []
-
-    for dt in zero_dates:
-        url, inner = nse_bhav_url_for_date(dt)
-        try:
-            zip_bytes = download_bhavzip(session_web, url)
-            df = parse_bhav_csv_from_zipbytes(zip_bytes, inner)
-            bhav_map = build_symbol_volume_map(df)
-            updated = update_volumes_for_date(session_db, dt, bhav_map)
-            LOG.info("Date %s — updated %d rows", dt, len(updated))
-            report.extend(updated)
+    # staging table lives for the whole run on this session's connection; emptied per date
+    session_db.execute(STAGE_DDL)
 
-        except requests.exceptions.HTTPError:
-            LOG.warning("No bhavcopy for %s (holiday?)", dt)
-        except Exception as e:
-            LOG.exception("Error processing %s: %s", dt, e)
+    report = []
 
-        time.sleep(REQUEST_PAUSE)
+    # downloads + parsing run on the pool; DB updates stay on this thread (the session is not thread-safe)
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        futures = {pool.submit(fetch_bhav_frame, session_web, dt): dt for dt in zero_dates}
+        for fut in as_completed(futures):
+            dt = futures[fut]
+            try:
+                bhav = fut.result()
+                # savepoint: a failing date rolls back only its own updates
+                with session_db.begin_nested():
+                    updated = update_volumes_for_date(session_db, dt, zero_rows[dt], bhav)
+                LOG.info("Date %s — updated %d rows", dt, len(updated))
+                report.extend(updated)
+
+            except HolidayError:
+                LOG.warning("No bhavcopy for %s (holiday?)", dt)
+            except Exception as e:
+                LOG.exception("Error processing %s: %s", dt, e)
+
+    # single commit for all dates (drop the staging table first: the pooled connection outlives this run)
+    try:
+        session_db.execute(text("DROP TEMPORARY TABLE IF EXISTS bhav_stage"))
+        session_db.commit()
+    except Exception:
+        session_db.rollback()
+        raise
 
     ts = datetime.datetime.utcnow().strftime("%Y%m%d_%H%M%S")
     out = REPORT_DIR / f"volume_fix_report_{ts}.csv"
@@ -257,6 +380,7 @@ def run_fix():
     else:
         LOG.info("No updates performed.")
 
+    save_cookies(session_web)
     session_db.close()
     LOG.info("Completed.")
 
@@ -10,12 +10,20 @@ Usage:
 """
 
 import os
+import sys
 import json
-import time
-import requests
+import pandas as pd
 from pathlib import Path
 from tenacity import retry, stop_after_attempt, wait_exponential
 
+# Ensure project root
+if __name__ == "__main__":
+    root = Path(__file__).resolve().parents[2]
+    if str(root) not in sys.path:
+        sys.path.append(str(root))
+
+from etl.utils.nse import nse_session, nse_get, save_cookies
+
 # Output directory
 UNIVERSE_DIR = Path("data/universe")
 UNIVERSE_DIR.mkdir(parents=True, exist_ok=True)
@@ -37,26 +45,25 @@ def fetch_nse_json():
     """
     NSE blocks bots heavily; this retry wrapper + cookie session bypasses it.
     """
-    session = requests.Session()
-    # First call to homepage -> required to get cookies
-    session.get("https://www.nseindia.com", headers=HEADERS, timeout=10)
-    time.sleep(1)
-
-    r = session.get(NSE_URL, headers=HEADERS, timeout=10)
+    # cached cookies when fresh; the homepage is only hit if NSE answers 401/403
+    session = nse_session()
+    r = nse_get(session, NSE_URL, HEADERS, timeout=10)
     r.raise_for_status()
+    save_cookies(session)
     return r.json()
 
 
-def convert_to_yf(symbol: str) -> str:
-    """Convert NSE symbol into yfinance ticker (adds .NS)."""
-    symbol = symbol.strip().upper()
-    return f"{symbol}.NS"
+def convert_to_yf(symbols: pd.Series) -> pd.Series:
+    """Convert NSE symbols into yfinance tickers (adds .NS); drops empty ones."""
+    symbols = symbols.dropna().astype(str).str.strip().str.upper()
+    return symbols[symbols != ""] + ".NS"
 
 
 def save_universe(symbols):
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        for sym in symbols:
-            f.write(sym + "\n")
+    # write a temp file and swap it in, so a crash never leaves a truncated universe
+    tmp = OUTPUT_FILE.with_suffix(".tmp")
+    tmp.write_text("".join(f"{sym}\n" for sym in symbols), encoding="utf-8")
+    tmp.replace(OUTPUT_FILE)
 
 
 def main():
@@ -66,19 +73,12 @@ def main():
     if "data" not in data:
         raise ValueError("Unexpected NSE response format")
 
-    stocks = data["data"]
+    stocks = pd.DataFrame(data["data"])
 
     print(f"Fetched {len(stocks)} records from NSE")
 
-    yf_tickers = []
-    for entry in stocks:
-        sym = entry.get("symbol")
-        if not sym:
-            continue
-        yf_sym = convert_to_yf(sym)
-        yf_tickers.append(yf_sym)
-
-    yf_tickers = sorted(list(set(yf_tickers)))  # unique + sorted
+    symbols = stocks["symbol"] if "symbol" in stocks.columns else pd.Series(dtype=object)
+    yf_tickers = convert_to_yf(symbols).drop_duplicates().sort_values().tolist()  # unique + sorted
 
     save_universe(yf_tickers)
 
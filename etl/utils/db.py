@@ -1,36 +1,79 @@
 from typing import List
-from sqlalchemy import select
-from database.session import SessionLocal
+from sqlalchemy import select, text, insert, tuple_, func
+from database.session import SessionLocal, bulk_engine
 from database.Models import Company, PriceHistory, ETLRun
+from etl.utils.iterutils import chunk_list
 import datetime
 
 def get_session():
+    """The calling thread's session: SessionLocal is scoped, so repeated calls reuse one session/connection."""
     return SessionLocal()
 
+def bulk_connection():
+    """
+    Transaction on the bulk engine (no pre-ping) for set-based sections:
+        with bulk_connection() as conn:
+            conn.execute(...)
+    Commits on success, rolls back on error.
+    """
+    return bulk_engine.begin()
+
+def _company_ids(session, keys) -> dict:
+    """(symbol, exchange) -> id for the given keys, one IN query per 1000 keys"""
+    found = {}
+    for part in chunk_list(keys, 1000):
+        stmt = select(Company.id, Company.symbol, Company.exchange).where(tuple_(Company.symbol, Company.exchange).in_(part))
+        found.update({(sym, exch): cid for cid, sym, exch in session.execute(stmt)})
+    return found
+
 def ensure_companies(session, symbols: List[dict]):
     """
     Accepts list of dicts: [{"symbol": "RELIANCE.NS", "name": "Reliance", "exchange": "NSE"}, ...]
     Inserts missing companies into companies table and returns mapping symbol -> company_id
+    One lookup query for all symbols, one bulk INSERT IGNORE for the missing ones (rows another run inserted
+    meanwhile are skipped on uq_symbol_exchange), one re-query for their ids (MySQL has no RETURNING).
     """
-    mapping = {}
-    for s in symbols:
-        sym = s["symbol"]
-        stmt = select(Company).where(Company.symbol == sym, Company.exchange == s.get("exchange", "NSE"))
-        res = session.execute(stmt).scalar_one_or_none()
-        if res is None:
-            c = Company(symbol=sym, name=s.get("name"), exchange=s.get("exchange", "NSE"))
-            session.add(c)
-            session.flush()  # get id
-            mapping[sym] = c.id
-        else:
-            mapping[sym] = res.id
-    return mapping
+    wanted = {(s["symbol"], s.get("exchange", "NSE")): s for s in symbols}
+    found = _company_ids(session, list(wanted))
+    missing = [key for key in wanted if key not in found]
+    if missing:
+        session.execute(
+            insert(Company).prefix_with("IGNORE"),
+            [{"symbol": sym, "name": wanted[(sym, exch)].get("name"), "exchange": exch} for sym, exch in missing],
+        )
+        found.update(_company_ids(session, missing))
+    return {sym: found[(sym, exch)] for sym, exch in wanted if (sym, exch) in found}
 
-def get_existing_dates(session, company_id: int):
-    """Return set of trade_date strings already present for company_id"""
-    stmt = select(PriceHistory.trade_date).where(PriceHistory.company_id == company_id)
-    res = session.execute(stmt).scalars().all()
-    return set([d.isoformat() for d in res])
+def get_latest_dates_bulk(session, company_ids: List[int]) -> dict:
+    """Return company_id -> latest trade_date in price_history (None if none), one GROUP BY query per 1000 ids"""
+    latest = dict.fromkeys(company_ids)
+    for part in chunk_list(company_ids, 1000):
+        stmt = (
+            select(PriceHistory.company_id, func.max(PriceHistory.trade_date))
+            .where(PriceHistory.company_id.in_(part))
+            .group_by(PriceHistory.company_id)
+        )
+        latest.update(session.execute(stmt).all())
+    return latest
+
+def bulk_update_by_id(session, table: str, column: str, pairs, chunk: int = 1000) -> int:
+    """
+    Set table.column for many rows by id: one UPDATE ... JOIN (VALUES ROW(...), ...) per chunk (MySQL 8.0.19+).
+    pairs: iterable of (id, value). table/column are trusted identifiers, ids/values are bound parameters.
+    session may also be a Connection (e.g. from bulk_connection). Does not commit; returns number of rows changed.
+    """
+    pairs = list(pairs)
+    changed = 0
+    for i in range(0, len(pairs), chunk):
+        part = pairs[i : i + chunk]
+        rows = ", ".join(f"ROW(:id{n}, :v{n})" for n in range(len(part)))
+        params = {}
+        for n, (row_id, value) in enumerate(part):
+            params[f"id{n}"] = row_id
+            params[f"v{n}"] = value
+        stmt = text(f"UPDATE {table} t JOIN (VALUES {rows}) AS v ON t.id = v.column_0 SET t.{column} = v.column_1")
+        changed += session.execute(stmt, params).rowcount
+    return changed
 
 def log_etl_run(session, pipeline_name: str, status: str, rows_processed: int = 0, error_message: str = None, started_at=None, ended_at=None):
     er = ETLRun(
@@ -0,0 +1,5 @@
+from curl_cffi import requests as curl_requests
+
+# One curl_cffi session for all yfinance calls across pipelines: browser impersonation, HTTP/2,
+# compression and connection/TLS reuse instead of a fresh handshake per ticker
+YF_SESSION = curl_requests.Session(impersonate="chrome")
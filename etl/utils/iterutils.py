@@ -0,0 +1,8 @@
+from itertools import islice
+
+
+def chunk_list(iterable, n):
+    """Yield lists of up to n items from any iterable, lazily (no slicing copy of the whole input)."""
+    it = iter(iterable)
+    while batch := list(islice(it, n)):
+        yield batch
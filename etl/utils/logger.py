@@ -1,27 +1,37 @@
+import atexit
 import logging
+import queue
 import sys
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
 
 LOG_DIR = Path("logs")
 LOG_DIR.mkdir(parents=True, exist_ok=True)
 LOG_FILE = LOG_DIR / "etl.log"
 
+_fmt = logging.Formatter("%(asctime)s %(levelname)s %(name)s - %(message)s")
+
+_stream_h = logging.StreamHandler(sys.stdout)
+_stream_h.setFormatter(_fmt)
+
+_file_h = RotatingFileHandler(LOG_FILE, maxBytes=10_000_000, backupCount=5)
+_file_h.setFormatter(_fmt)
+
+# Loggers only enqueue records; one background thread formats them and does the console/file I/O
+# (incl. rotation), so ETL loops never block on disk. Stopped at exit to flush what's queued.
+_queue = queue.SimpleQueue()
+_listener = QueueListener(_queue, _stream_h, _file_h, respect_handler_level=True)
+_listener.start()
+atexit.register(_listener.stop)
+
+
 def get_logger(name: str = "etl", level: int = logging.INFO):
     logger = logging.getLogger(name)
     if logger.handlers:
         return logger
 
     logger.setLevel(level)
-    fmt = logging.Formatter("%(asctime)s %(levelname)s %(name)s - %(message)s")
-
-    stream_h = logging.StreamHandler(sys.stdout)
-    stream_h.setFormatter(fmt)
-    logger.addHandler(stream_h)
-
-    file_h = RotatingFileHandler(LOG_FILE, maxBytes=10_000_000, backupCount=5)
-    file_h.setFormatter(fmt)
-    logger.addHandler(file_h)
+    logger.addHandler(QueueHandler(_queue))
 
     logger.propagate = False
     return logger
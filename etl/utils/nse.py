@@ -0,0 +1,58 @@
+import pickle
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+# NSE hands out its anti-bot cookies on the homepage. They are pickled here and reused across runs
+# while fresh, so scripts skip the homepage round-trip (and the sleep after it) on most invocations.
+NSE_HOME = "https://www.nseindia.com"
+COOKIE_CACHE = Path.home() / ".cache" / "nse_cookies.pickle"
+COOKIE_MAX_AGE = 30 * 60  # seconds
+
+_prime_lock = threading.Lock()
+
+
+def load_cookies(session: requests.Session) -> bool:
+    """Load the cached cookie jar into session if it is younger than COOKIE_MAX_AGE; returns whether it did."""
+    try:
+        if time.time() - COOKIE_CACHE.stat().st_mtime > COOKIE_MAX_AGE:
+            return False
+        with open(COOKIE_CACHE, "rb") as f:
+            session.cookies.update(pickle.load(f))
+        return True
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return False
+
+
+def save_cookies(session: requests.Session):
+    COOKIE_CACHE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = COOKIE_CACHE.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        pickle.dump(session.cookies, f)
+    tmp.replace(COOKIE_CACHE)
+
+
+def prime(session: requests.Session, headers: dict):
+    """Fetch fresh cookies from the homepage and persist them (one thread at a time)."""
+    with _prime_lock:
+        session.get(NSE_HOME, headers=headers, timeout=10)
+        save_cookies(session)
+
+
+def nse_session() -> requests.Session:
+    """requests Session preloaded with cached NSE cookies when fresh; no network call."""
+    session = requests.Session()
+    load_cookies(session)
+    return session
+
+
+def nse_get(session: requests.Session, url: str, headers: dict, **kwargs) -> requests.Response:
+    """GET url; on 401/403 (missing or expired cookies) prime from the homepage once and retry."""
+    r = session.get(url, headers=headers, **kwargs)
+    if r.status_code in (401, 403):
+        r.close()
+        prime(session, headers)
+        r = session.get(url, headers=headers, **kwargs)
+    return r
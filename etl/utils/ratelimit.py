@@ -0,0 +1,29 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket: allows `rate` calls per `per` seconds (bursts up to `rate`).
+    acquire() blocks the calling thread until a token is available, so workers sharing
+    one limiter stay polite towards a host without serializing on fixed sleeps.
+    """
+
+    def __init__(self, rate: float, per: float = 1.0):
+        self.rate = rate
+        self.per = per
+        self._tokens = float(rate)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate / self.per)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) * self.per / self.rate
+            time.sleep(wait)
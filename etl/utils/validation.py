@@ -1,32 +1,30 @@
 import pandas as pd
 import numpy as np
 
+PRICE_COLS = ["Open", "High", "Low", "Close", "Adj Close"]
+
+
 def validate_ohlcv(df: pd.DataFrame) -> pd.DataFrame:
     """
     Basic validation and cleaning for raw OHLCV dataframe from yfinance.
     - Drop rows with all NaNs
     - Remove negative or zero prices
     - Fill small gaps via forward-fill for prices, volume set to 0 if missing
-    Returns cleaned df
+    Returns cleaned df. dropna hands back a new frame, so the caller's df is not
+    modified; callers holding views of it should still copy first.
     """
-    df = df.copy()
     df = df.dropna(how="all")
     # ensure index is date
     if not isinstance(df.index, pd.DatetimeIndex):
         df.index = pd.to_datetime(df.index, errors="coerce")
     df = df[~df.index.isna()]
 
-    # Remove non-positive prices
-    price_cols = ["Open", "High", "Low", "Close", "Adj Close"]
-    for c in price_cols:
-        if c in df.columns:
-            df.loc[df[c] <= 0, c] = pd.NA
-
-    # forward fill small missing values
-    df[["Open", "High", "Low", "Close", "Adj Close"]] = df[["Open", "High", "Low", "Close", "Adj Close"]].ffill()
+    # Non-positive prices -> NaN, then forward fill small gaps (one pass over the block)
+    present = [c for c in PRICE_COLS if c in df.columns]
+    prices = df[present]
+    df[present] = prices.where(prices > 0).ffill()
     # volume -> fill 0
     if "Volume" in df.columns:
-        df["Volume"] = df["Volume"].fillna(0).astype("int64")
+        df["Volume"] = df["Volume"].fillna(0).to_numpy(dtype=np.int64)
     # drop remaining rows missing Close
-    df = df.dropna(subset=["Close", "Adj Close"], how="any")
-    return df
+    return df.dropna(subset=[c for c in ("Close", "Adj Close") if c in df.columns], how="any")
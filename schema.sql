@@ -26,6 +26,11 @@ USE `spo_db`;
 CREATE TABLE IF NOT EXISTS companies (
     id INT PRIMARY KEY AUTO_INCREMENT,
     symbol VARCHAR(32) NOT NULL,
+    -- NSE symbol without the exchange suffix (RELIANCE.NS -> RELIANCE), joined against bhavcopies. Existing DBs:
+    --   ALTER TABLE companies ADD COLUMN base_symbol VARCHAR(32)
+    --       GENERATED ALWAYS AS (UPPER(SUBSTRING_INDEX(TRIM(symbol), '.', 1))) STORED AFTER symbol,
+    --       ADD KEY idx_companies_base_symbol (base_symbol);
+    base_symbol VARCHAR(32) GENERATED ALWAYS AS (UPPER(SUBSTRING_INDEX(TRIM(symbol), '.', 1))) STORED,
     name VARCHAR(128),
     exchange VARCHAR(32) NOT NULL,
     sector VARCHAR(64),
@@ -34,7 +39,8 @@ CREATE TABLE IF NOT EXISTS companies (
     listing_date DATE,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-    UNIQUE KEY uq_symbol_exchange (symbol, exchange)
+    UNIQUE KEY uq_symbol_exchange (symbol, exchange),
+    KEY idx_companies_base_symbol (base_symbol)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- 2. corporate_actions
@@ -51,8 +57,17 @@ CREATE TABLE IF NOT EXISTS corporate_actions (
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- 3. price_history
+-- RANGE-partitioned by year on trade_date (partition pruning for date-range scans).
+-- MySQL requires trade_date in every unique key (hence the composite PK) and does not support
+-- foreign keys on partitioned tables, so company_id is not an FK here: trg_companies_delete_prices
+-- (below) deletes a company's rows instead of ON DELETE CASCADE.
+-- Existing pre-partitioning databases: database/upgrade_price_history_partitioning.sql
+-- Add the next year before it starts by splitting pmax:
+--   ALTER TABLE price_history REORGANIZE PARTITION pmax INTO (
+--       PARTITION p2028 VALUES LESS THAN (TO_DAYS('2029-01-01')),
+--       PARTITION pmax VALUES LESS THAN MAXVALUE);
 CREATE TABLE IF NOT EXISTS price_history (
-    id BIGINT PRIMARY KEY AUTO_INCREMENT,
+    id BIGINT NOT NULL AUTO_INCREMENT,
     company_id INT NOT NULL,
     trade_date DATE NOT NULL,
     open DECIMAL(24,6),
@@ -62,25 +77,62 @@ CREATE TABLE IF NOT EXISTS price_history (
     adj_close DECIMAL(24,6),
     volume BIGINT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, trade_date),
     UNIQUE KEY uq_price_company_date (company_id, trade_date),
-    KEY idx_price_company_date (company_id, trade_date),
-    CONSTRAINT fk_price_company FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE
-) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+    KEY idx_price_company_date (company_id, trade_date) USING BTREE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+PARTITION BY RANGE (TO_DAYS(trade_date)) (
+    PARTITION p2000 VALUES LESS THAN (TO_DAYS('2001-01-01')),
+    PARTITION p2001 VALUES LESS THAN (TO_DAYS('2002-01-01')),
+    PARTITION p2002 VALUES LESS THAN (TO_DAYS('2003-01-01')),
+    PARTITION p2003 VALUES LESS THAN (TO_DAYS('2004-01-01')),
+    PARTITION p2004 VALUES LESS THAN (TO_DAYS('2005-01-01')),
+    PARTITION p2005 VALUES LESS THAN (TO_DAYS('2006-01-01')),
+    PARTITION p2006 VALUES LESS THAN (TO_DAYS('2007-01-01')),
+    PARTITION p2007 VALUES LESS THAN (TO_DAYS('2008-01-01')),
+    PARTITION p2008 VALUES LESS THAN (TO_DAYS('2009-01-01')),
+    PARTITION p2009 VALUES LESS THAN (TO_DAYS('2010-01-01')),
+    PARTITION p2010 VALUES LESS THAN (TO_DAYS('2011-01-01')),
+    PARTITION p2011 VALUES LESS THAN (TO_DAYS('2012-01-01')),
+    PARTITION p2012 VALUES LESS THAN (TO_DAYS('2013-01-01')),
+    PARTITION p2013 VALUES LESS THAN (TO_DAYS('2014-01-01')),
+    PARTITION p2014 VALUES LESS THAN (TO_DAYS('2015-01-01')),
+    PARTITION p2015 VALUES LESS THAN (TO_DAYS('2016-01-01')),
+    PARTITION p2016 VALUES LESS THAN (TO_DAYS('2017-01-01')),
+    PARTITION p2017 VALUES LESS THAN (TO_DAYS('2018-01-01')),
+    PARTITION p2018 VALUES LESS THAN (TO_DAYS('2019-01-01')),
+    PARTITION p2019 VALUES LESS THAN (TO_DAYS('2020-01-01')),
+    PARTITION p2020 VALUES LESS THAN (TO_DAYS('2021-01-01')),
+    PARTITION p2021 VALUES LESS THAN (TO_DAYS('2022-01-01')),
+    PARTITION p2022 VALUES LESS THAN (TO_DAYS('2023-01-01')),
+    PARTITION p2023 VALUES LESS THAN (TO_DAYS('2024-01-01')),
+    PARTITION p2024 VALUES LESS THAN (TO_DAYS('2025-01-01')),
+    PARTITION p2025 VALUES LESS THAN (TO_DAYS('2026-01-01')),
+    PARTITION p2026 VALUES LESS THAN (TO_DAYS('2027-01-01')),
+    PARTITION p2027 VALUES LESS THAN (TO_DAYS('2028-01-01')),
+    PARTITION pmax VALUES LESS THAN MAXVALUE
+);
+
+DROP TRIGGER IF EXISTS trg_companies_delete_prices;
+CREATE TRIGGER trg_companies_delete_prices BEFORE DELETE ON companies
+FOR EACH ROW DELETE FROM price_history WHERE company_id = OLD.id;
 
 -- 4. features_daily
+-- Statistic columns are DOUBLE and *_json columns JSON; databases created with DECIMAL/LONGTEXT:
+--   database/upgrade_double_json_columns.sql
 CREATE TABLE IF NOT EXISTS features_daily (
     id BIGINT PRIMARY KEY AUTO_INCREMENT,
     company_id INT NOT NULL,
     feature_date DATE NOT NULL,
-    return_1d DECIMAL(24,6),
-    return_5d DECIMAL(24,6),
-    return_10d DECIMAL(24,6),
-    return_21d DECIMAL(24,6),
-    volatility_10d DECIMAL(24,6),
-    volatility_20d DECIMAL(24,6),
-    volatility_60d DECIMAL(24,6),
-    momentum_14d DECIMAL(24,6),
-    volume_change_5d DECIMAL(24,6),
+    return_1d DOUBLE,
+    return_5d DOUBLE,
+    return_10d DOUBLE,
+    return_21d DOUBLE,
+    volatility_10d DOUBLE,
+    volatility_20d DOUBLE,
+    volatility_60d DOUBLE,
+    momentum_14d DOUBLE,
+    volume_change_5d DOUBLE,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     UNIQUE KEY uq_features_company_date (company_id, feature_date),
     CONSTRAINT fk_features_company FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE
@@ -91,7 +143,7 @@ CREATE TABLE IF NOT EXISTS model_predictions (
     id BIGINT PRIMARY KEY AUTO_INCREMENT,
     company_id INT NOT NULL,
     prediction_date DATE NOT NULL,
-    predicted_return DECIMAL(24,6),
+    predicted_return DOUBLE,
     model_version VARCHAR(128) NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     UNIQUE KEY uq_pred_company_date_version (company_id, prediction_date, model_version),
@@ -99,11 +151,14 @@ CREATE TABLE IF NOT EXISTS model_predictions (
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- 6. covariance_matrices
+-- matrix_blob: zstd-compressed raw array bytes (database/serialization.py). Databases created with the
+-- old matrix_json LONGTEXT column: python -m database.upgrade_covariance_blob (adds the columns, re-encodes rows)
 CREATE TABLE IF NOT EXISTS covariance_matrices (
     id BIGINT PRIMARY KEY AUTO_INCREMENT,
     calc_date DATE NOT NULL,
     num_assets INT NOT NULL,
-    matrix_json LONGTEXT NOT NULL,
+    matrix_blob LONGBLOB NOT NULL,
+    dtype VARCHAR(16) NOT NULL DEFAULT 'float64',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     UNIQUE KEY uq_cov_calc_date (calc_date)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -112,7 +167,7 @@ CREATE TABLE IF NOT EXISTS covariance_matrices (
 CREATE TABLE IF NOT EXISTS optimized_portfolios (
     id BIGINT PRIMARY KEY AUTO_INCREMENT,
     portfolio_date DATE NOT NULL,
-    weights_json LONGTEXT NOT NULL,
+    weights_json JSON NOT NULL,
     objective_value DECIMAL(24,6),
     model_version VARCHAR(128) NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -125,10 +180,10 @@ CREATE TABLE IF NOT EXISTS backtest_results (
     run_id VARCHAR(128) NOT NULL,
     start_date DATE NOT NULL,
     end_date DATE NOT NULL,
-    sharpe DECIMAL(24,6),
-    max_drawdown DECIMAL(24,6),
-    total_return DECIMAL(24,6),
-    parameters_json LONGTEXT,
+    sharpe DOUBLE,
+    max_drawdown DOUBLE,
+    total_return DOUBLE,
+    parameters_json JSON,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
@@ -164,6 +219,7 @@ CREATE TABLE IF NOT EXISTS financials_balance_sheet (
     retained_earnings DECIMAL(30,2),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     UNIQUE KEY uq_bs_company_fy_fq (company_id, fiscal_year, fiscal_quarter),
+    UNIQUE KEY uq_bs_company_report (company_id, report_date),
     CONSTRAINT fk_bs_company FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
@@ -186,6 +242,7 @@ CREATE TABLE IF NOT EXISTS financials_income_statement (
     ebitda DECIMAL(30,2),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     UNIQUE KEY uq_is_company_fy_fq (company_id, fiscal_year, fiscal_quarter),
+    KEY idx_is_company_report (company_id, report_date),
     CONSTRAINT fk_is_company FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
@@ -203,6 +260,7 @@ CREATE TABLE IF NOT EXISTS financials_cashflow_statement (
     free_cash_flow DECIMAL(30,2),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     UNIQUE KEY uq_cf_company_fy_fq (company_id, fiscal_year, fiscal_quarter),
+    KEY idx_cf_company_report (company_id, report_date),
     CONSTRAINT fk_cf_company FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
@@ -225,6 +283,7 @@ CREATE TABLE IF NOT EXISTS financial_ratios (
     fcf_yield DECIMAL(24,8),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     UNIQUE KEY uq_ratios_company_fy_fq (company_id, fiscal_year, fiscal_quarter),
+    KEY idx_ratios_company_report (company_id, report_date),
     CONSTRAINT fk_ratios_company FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
@@ -245,7 +304,7 @@ CREATE TABLE IF NOT EXISTS model_versions (
     model_type VARCHAR(64) NOT NULL,
     train_start DATE,
     train_end DATE,
-    hyperparams_json LONGTEXT,
+    hyperparams_json JSON,
     notes TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -265,6 +324,9 @@ CREATE TABLE IF NOT EXISTS events (
 
 -- Indexes for performance (examples)
 CREATE INDEX idx_price_trade_date ON price_history (trade_date);
+-- zero-volume repair (fix_zero_volume_nse): MySQL has no partial indexes, so volume leads and
+-- `volume = 0` is a single range already ordered by trade_date; online build on an existing table
+CREATE INDEX idx_price_volume_date ON price_history (volume, trade_date) ALGORITHM=INPLACE LOCK=NONE;
 CREATE INDEX idx_features_date ON features_daily (feature_date);
 CREATE INDEX idx_pred_date ON model_predictions (prediction_date);
 CREATE INDEX idx_cov_date ON covariance_matrices (calc_date);